@@ -7,6 +7,9 @@ import logging
 
 import ftrack_api
 from ftrack_hooks.action import BaseAction
+from ftrack_hooks.job import (
+    JobProgress, get_api_writer, track_job, release_job
+)
 
 
 def async(fn):
@@ -35,25 +38,43 @@ def create_job(event, session):
     )
     # Commit to feedback to user.
     session.commit()
+    track_job(job["id"])
 
     try:
-        for directory in event["data"]["directories"]:
-            if not os.path.exists(directory):
-                print 'Create directory: "{0}"'.format(directory)
-                os.makedirs(directory)
-
-        for src, dst in event["data"]["files"]:
-            if not os.path.exists(dst):
-                print 'Copy "{0}" to "{1}"'.format(src, dst)
-                shutil.copy(src, dst)
-    except:
-        print traceback.format_exc()
-        job["status"] = "failed"
-    else:
-        job["status"] = "done"
-
-    # Commit to end job.
-    session.commit()
+        progress = JobProgress(
+            get_api_writer(session, job),
+            'Create Structure: Generate file structure.',
+            total=(
+                len(event["data"]["directories"]) + len(event["data"]["files"])
+            )
+        )
+
+        try:
+            for directory in event["data"]["directories"]:
+                if not os.path.exists(directory):
+                    print 'Create directory: "{0}"'.format(directory)
+                    os.makedirs(directory)
+
+                progress.update(items=1)
+
+            for src, dst in event["data"]["files"]:
+                if not os.path.exists(dst):
+                    print 'Copy "{0}" to "{1}"'.format(src, dst)
+                    shutil.copy(src, dst)
+
+                progress.update(items=1)
+        except:
+            print traceback.format_exc()
+            progress.finish()
+            job["status"] = "failed"
+        else:
+            progress.finish()
+            job["status"] = "done"
+
+        # Commit to end job.
+        session.commit()
+    finally:
+        release_job(job["id"])
 
 
 class CreateStructureAction(BaseAction):
@@ -130,27 +151,31 @@ class CreateStructureAction(BaseAction):
             )
             # Commit to feedback to user about running job.
             session.commit()
+            track_job(job["id"])
 
             try:
-                data = event["data"]
-                data["entities"] = entity_objects
-                data["directories"] = []
-                data["files"] = []
-                session.event_hub.publish(
-                    ftrack_api.event.base.Event(
-                        topic='create_structure.launch',
-                        data=data
-                    ),
-                    synchronous=True
-                )
-            except:
-                print traceback.format_exc()
-                job["status"] = "failed"
-            else:
-                job["status"] = "done"
-
-            # Commit to end job.
-            session.commit()
+                try:
+                    data = event["data"]
+                    data["entities"] = entity_objects
+                    data["directories"] = []
+                    data["files"] = []
+                    session.event_hub.publish(
+                        ftrack_api.event.base.Event(
+                            topic='create_structure.launch',
+                            data=data
+                        ),
+                        synchronous=True
+                    )
+                except:
+                    print traceback.format_exc()
+                    job["status"] = "failed"
+                else:
+                    job["status"] = "done"
+
+                # Commit to end job.
+                session.commit()
+            finally:
+                release_job(job["id"])
 
             create_job(event, session)
 
@@ -11,6 +11,9 @@ import ftrack
 import ftrack_api
 from ftrack_connect.session import get_shared_session
 import ftrack_connect.application
+from ftrack_hooks.job import (
+    JobProgress, get_legacy_writer, track_job, release_job
+)
 
 
 class DJVViewAction(object):
@@ -169,27 +172,35 @@ class DJVViewAction(object):
         job = ftrack.createJob("DJV: Scanning for files.", "queued",
                                ftrack.User(id=event["source"]["user"]["id"]))
         job.setStatus("running")
-
+        track_job(job.getId())
         try:
-            ftrack.EVENT_HUB.publish(
-                ftrack.Event(
-                    topic='djvview.launch',
-                    data=data
-                ),
-                synchronous=True
-            )
-            session = get_shared_session()
-            session.event_hub.publish(
-                ftrack_api.event.base.Event(
-                    topic='djvview.launch',
-                    data=data
-                ),
-                synchronous=True
+            progress = JobProgress(
+                get_legacy_writer(job), "DJV: Scanning for files."
             )
-        except:
-            job.setStatus("failed")
-        else:
-            job.setStatus("done")
+
+            try:
+                ftrack.EVENT_HUB.publish(
+                    ftrack.Event(
+                        topic='djvview.launch',
+                        data=data
+                    ),
+                    synchronous=True
+                )
+                session = get_shared_session()
+                session.event_hub.publish(
+                    ftrack_api.event.base.Event(
+                        topic='djvview.launch',
+                        data=data
+                    ),
+                    synchronous=True
+                )
+            except:
+                job.setStatus("failed")
+            else:
+                progress.finish("{0} items found.".format(len(data["items"])))
+                job.setStatus("done")
+        finally:
+            release_job(job.getId())
 
         return {
             "items": [
@@ -0,0 +1,144 @@
+# :coding: utf-8
+import os
+from multiprocessing.pool import ThreadPool
+
+import clique
+import ftrack_api.event.base
+import ftrack_api.symbol
+
+
+def _get_size(path):
+    '''Return the size of the file at *path*, or 0 if it can not be read.'''
+    try:
+        return os.stat(path).st_size
+    except OSError:
+        return 0
+
+
+def get_sizes(paths, workers=8):
+    '''Return the sizes of the files at *paths* by path.
+
+    The files are stat'ed by a pool of *workers* threads, as Python 2 has
+    no `os.scandir` to read them with their directory. Missing files have a
+    size of 0.
+
+    '''
+    paths = list(set(paths))
+    if len(paths) < 2 or workers < 2:
+        return dict((path, _get_size(path)) for path in paths)
+
+    pool = ThreadPool(min(workers, len(paths)))
+    try:
+        return dict(zip(paths, pool.map(_get_size, paths)))
+    finally:
+        pool.close()
+        pool.join()
+
+
+def get_file_type(session, path):
+    '''Return the file type of *path*, like `Session.create_component`.
+
+    Plugins answering "ftrack.api.session.get-file-type-from-string" are
+    asked first, before falling back to the extension of *path*.
+
+    '''
+    results = session.event_hub.publish(
+        ftrack_api.event.base.Event(
+            topic='ftrack.api.session.get-file-type-from-string',
+            data=dict(file_path=path)
+        ),
+        synchronous=True
+    )
+    file_type = next((result for result in results if result), None)
+    if not file_type:
+        return os.path.splitext(path)[-1]
+    return file_type
+
+
+def create_members(session, container, collection, sizes, file_type):
+    '''Create a FileComponent in *container* for every member of *collection*.
+
+    Returns a list of (member, path) tuples. *sizes* are the sizes of the
+    member paths, see `get_sizes`, and *file_type* the one of *container*.
+
+    '''
+    members = []
+    for path in collection:
+        member = session.create('FileComponent', {
+            'name': collection.match(path).group('index'),
+            'container': container,
+            'size': sizes.get(path, 0),
+            'file_type': file_type
+        })
+        container['members'].append(member)
+        members.append((member, path))
+
+    return members
+
+
+def create_components(session, components, location=None):
+    '''Create and register *components* in bulk, and return them.
+
+    *components* is a list of dictionaries with the "version" and "name"
+    of a component and its "path", either a file path or a clique
+    collection of a sequence. The components and their members are built
+    in one pass, as `Session.create_component` would. All files are sized
+    at once with `get_sizes`, everything is added to the origin location
+    in a single call and, if given, to *location* in another one.
+
+    '''
+    paths = []
+    for component in components:
+        if isinstance(component['path'], clique.Collection):
+            paths.extend(component['path'])
+        else:
+            paths.append(component['path'])
+    sizes = get_sizes(paths)
+
+    entities = []
+    origin_components = []
+    origin_sources = []
+    for component in components:
+        path = component['path']
+        data = {'name': component['name'], 'version': component['version']}
+
+        if not isinstance(path, clique.Collection):
+            data['size'] = sizes.get(path, 0)
+            data['file_type'] = get_file_type(session, path)
+            entity = session.create('FileComponent', data)
+
+            entities.append(entity)
+            origin_components.append(entity)
+            origin_sources.append(path)
+            continue
+
+        source = path.format('{head}{padding}{tail}')
+        data['padding'] = path.padding
+        data['file_type'] = get_file_type(session, source)
+        data['size'] = sum(sizes.get(member, 0) for member in path)
+        entity = session.create('SequenceComponent', data)
+
+        entities.append(entity)
+        origin_components.append(entity)
+        origin_sources.append(source)
+
+        for member, member_path in create_members(
+            session, entity, path, sizes, data['file_type']
+        ):
+            origin_components.append(member)
+            origin_sources.append(member_path)
+
+    if not entities:
+        return entities
+
+    origin = session.get('Location', ftrack_api.symbol.ORIGIN_LOCATION_ID)
+    origin.add_components(
+        origin_components, origin_sources, recursive=False
+    )
+
+    if location is not None:
+        location.add_components(
+            entities, [origin] * len(entities), recursive=True
+        )
+
+    return entities
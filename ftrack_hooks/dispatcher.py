@@ -0,0 +1,339 @@
+# :coding: utf-8
+import collections
+import logging
+import threading
+import uuid
+
+import ftrack_api.event.base
+
+from ftrack_hooks.query import query_in
+
+
+#: Topic of the events flushing a dispatcher on the event hub thread.
+FLUSH_TOPIC = 'ftrack_hooks.dispatcher.flush'
+
+
+def _new_status_id(entity_data):
+    '''Return the new status id of *entity_data* if the status changed.'''
+    change = (entity_data.get('changes') or {}).get('statusid') or {}
+    return change.get('new')
+
+
+class UpdateDispatcher(object):
+    '''Coalesce "ftrack.update" events and dispatch them to handlers.
+
+    Entities of incoming events are filtered locally against the registered
+    handlers without touching the session. Matching entities are collected
+    for `window` seconds, deduplicated per entity and resolved in bulk before
+    the handlers are called.
+
+    The session is not thread safe, so the buffer is not flushed by the
+    timer itself. The timer publishes a flush event instead, which is
+    handled on the event hub thread like every other event of the session.
+
+    '''
+
+    def __init__(self, session, subscription='topic=ftrack.update',
+                 window=0.5):
+        '''Expects a ftrack_api.Session instance'''
+        self.session = session
+        self.subscription = subscription
+        self.window = window
+
+        self.logger = logging.getLogger(
+            '{0}.{1}'.format(__name__, self.__class__.__name__)
+        )
+
+        self._handlers = []
+        self._pending = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._timer = None
+        self._token = uuid.uuid4().hex
+
+    def subscribe(self):
+        '''Subscribe to the events matching `subscription`.'''
+        self.session.event_hub.subscribe(self.subscription, self._on_event)
+        self.session.event_hub.subscribe(
+            'topic={0} and data.token={1}'.format(FLUSH_TOPIC, self._token),
+            self._on_flush
+        )
+
+    def register(self, handler, entity_type='task', keys=('statusid',),
+                 actions=('update',), statuses=None, resolve='Task',
+                 projections=None, accept=None):
+        '''Register *handler* to be called with matching updates.
+
+        *handler* is called with the session and a list of updates, each a
+        dictionary with the keys `entity_type`, `entity_id`, `entity_data`,
+        `event`, `entity` and `status`.
+
+        *entity_type*, *keys* and *actions* filter the entities of the event
+        data, an entity matches if any of *keys* changed.
+
+        *statuses* is an optional list of lower case status names the new
+        status of the entity must match.
+
+        *resolve* is the API entity type to resolve the entities as, with
+        the attributes in *projections*. Set to None to skip resolving.
+
+        *accept* is an optional callable receiving the event, returning
+        False to ignore the event before any entity is looked at.
+
+        '''
+        if statuses is not None:
+            statuses = [status.lower() for status in statuses]
+
+        self._handlers.append({
+            'handler': handler,
+            'entity_type': entity_type,
+            'keys': set(keys or []),
+            'actions': set(actions or []),
+            'statuses': statuses,
+            'resolve': resolve,
+            'projections': list(projections or []),
+            'accept': accept
+        })
+
+    def _matches(self, registration, entity_data):
+        '''Return whether *entity_data* matches *registration*.'''
+        entity_type = (entity_data.get('entityType') or '').lower()
+        if entity_type != registration['entity_type']:
+            return False
+
+        if (
+            registration['actions'] and
+            entity_data.get('action') not in registration['actions']
+        ):
+            return False
+
+        if (
+            registration['keys'] and
+            not registration['keys'].intersection(entity_data.get('keys', []))
+        ):
+            return False
+
+        return True
+
+    def _on_event(self, event):
+        '''Buffer the entities of *event* that any handler is interested in.'''
+        registrations = [
+            registration for registration in self._handlers
+            if registration['accept'] is None or registration['accept'](event)
+        ]
+        if not registrations:
+            return
+
+        entities = []
+        for entity_data in event['data'].get('entities', []):
+            for registration in registrations:
+                if self._matches(registration, entity_data):
+                    entities.append(entity_data)
+                    break
+
+        if not entities:
+            return
+
+        with self._lock:
+            for entity_data in entities:
+                key = (entity_data['entityType'], entity_data['entityId'])
+                update = self._pending.pop(key, None)
+                self._pending[key] = self._merge(update, entity_data, event)
+
+            if self._timer is None:
+                self._timer = threading.Timer(
+                    self.window, self._publish_flush
+                )
+                self._timer.daemon = True
+                self._timer.start()
+
+    def _publish_flush(self):
+        '''Ask the event hub thread to flush the buffered updates.'''
+        try:
+            self.session.event_hub.publish(
+                ftrack_api.event.base.Event(
+                    topic=FLUSH_TOPIC, data={'token': self._token}
+                ),
+                on_error='raise'
+            )
+        except Exception:
+            self.logger.exception(
+                'Failed to publish flush, retrying with the next event.'
+            )
+            with self._lock:
+                self._timer = None
+
+    def _on_flush(self, event):
+        '''Flush the buffered updates on the event hub thread.'''
+        self._flush()
+
+    def _merge(self, update, entity_data, event):
+        '''Return *update* merged with the newer *entity_data*.'''
+        if update is None:
+            return {
+                'entity_type': entity_data['entityType'],
+                'entity_id': entity_data['entityId'],
+                'entity_data': dict(entity_data),
+                'event': event
+            }
+
+        # Keep the first old value and the latest new value of each change.
+        changes = dict(update['entity_data'].get('changes') or {})
+        for key, change in (entity_data.get('changes') or {}).items():
+            if key in changes:
+                change = dict(change)
+                change['old'] = changes[key].get('old')
+
+            changes[key] = change
+
+        keys = list(update['entity_data'].get('keys', []))
+        keys.extend(
+            key for key in entity_data.get('keys', []) if key not in keys
+        )
+
+        merged = dict(entity_data)
+        merged['changes'] = changes
+        merged['keys'] = keys
+
+        update['entity_data'] = merged
+        update['event'] = event
+
+        return update
+
+    def _flush(self):
+        '''Dispatch the buffered updates.'''
+        with self._lock:
+            updates = list(self._pending.values())
+            self._pending = collections.OrderedDict()
+            self._timer = None
+
+        if not updates:
+            return
+
+        try:
+            self.dispatch(updates)
+        except Exception:
+            self.logger.exception('Failed to dispatch updates.')
+
+    def dispatch(self, updates):
+        '''Resolve *updates* in bulk and call the registered handlers.'''
+        session = self.session
+
+        # Resolve new statuses.
+        status_ids = set()
+        for update in updates:
+            status_id = _new_status_id(update['entity_data'])
+            if status_id:
+                status_ids.add(status_id)
+
+        statuses = {}
+        for status in query_in(
+            session, 'select name from Status where id in ({0})', status_ids
+        ):
+            statuses[status['id']] = status
+
+        for update in updates:
+            update['status'] = statuses.get(
+                _new_status_id(update['entity_data'])
+            )
+
+        # Filter updates per handler.
+        dispatches = []
+        for registration in self._handlers:
+            matching = []
+            for update in updates:
+                if (
+                    registration['accept'] is not None and
+                    not registration['accept'](update['event'])
+                ):
+                    continue
+
+                if not self._matches(registration, update['entity_data']):
+                    continue
+
+                if registration['statuses'] is not None:
+                    if update['status'] is None:
+                        continue
+
+                    name = update['status']['name'].lower()
+                    if name not in registration['statuses']:
+                        continue
+
+                matching.append(update)
+
+            if matching:
+                dispatches.append((registration, matching))
+
+        # Resolve entities once per type with the projections of all handlers.
+        projections = collections.defaultdict(set)
+        entity_ids = collections.defaultdict(set)
+        for registration, matching in dispatches:
+            if registration['resolve'] is None:
+                continue
+
+            projections[registration['resolve']].update(
+                registration['projections']
+            )
+            entity_ids[registration['resolve']].update(
+                update['entity_id'] for update in matching
+            )
+
+        entities = {}
+        for entity_type, ids in entity_ids.items():
+            expression = '{0} where id in ({{0}})'.format(entity_type)
+            if projections[entity_type]:
+                expression = 'select {0} from {1}'.format(
+                    ', '.join(sorted(projections[entity_type])), expression
+                )
+
+            for entity in query_in(session, expression, ids):
+                entities[(entity_type, entity['id'])] = entity
+
+        for registration, matching in dispatches:
+            handler_updates = []
+            for update in matching:
+                update = dict(update)
+                update['entity'] = entities.get(
+                    (registration['resolve'], update['entity_id'])
+                )
+
+                # Skip entities that have been removed since the event.
+                if registration['resolve'] and update['entity'] is None:
+                    continue
+
+                handler_updates.append(update)
+
+            if not handler_updates:
+                continue
+
+            try:
+                registration['handler'](session, handler_updates)
+            except Exception:
+                self.logger.exception(
+                    'Handler {0!r} failed.'.format(registration['handler'])
+                )
+
+
+_dispatchers = {}
+_dispatchers_lock = threading.Lock()
+
+
+def get_dispatcher(session, subscription='topic=ftrack.update'):
+    '''Return the shared dispatcher of *session* for *subscription*.
+
+    Hooks registering with the same session and subscription share a single
+    dispatcher, and so a single subscription and bulk lookup per batch.
+    Keep subscriptions as narrow as the hook allows, the event hub only
+    sends the events matching them.
+
+    '''
+    key = (id(session), subscription)
+
+    with _dispatchers_lock:
+        dispatcher = _dispatchers.get(key)
+
+        if dispatcher is None or dispatcher.session is not session:
+            dispatcher = UpdateDispatcher(session, subscription)
+            dispatcher.subscribe()
+            _dispatchers[key] = dispatcher
+
+    return dispatcher
@@ -1,6 +1,8 @@
 from operator import itemgetter
 import ftrack
 
+from ftrack_hooks.query import query_in
+
 
 def get_file_for_component(component):
     file_path = component.getFilesystemPath()
@@ -14,6 +16,80 @@ def get_file_for_component(component):
     return file_path
 
 
+def _get_filesystem_path(location, identifier):
+    try:
+        return location.accessor.get_filesystem_path(identifier)
+    except Exception:
+        return identifier
+
+
+def get_files_for_components(session, components, first_frame=True):
+    """Return the file paths of ftrack_api *components* by component id.
+
+    Paths are resolved in bulk from the preferred location, and one by one
+    for components not available there. Sequences are formatted with their
+    first frame like `get_file_for_component`, unless *first_frame* is
+    False.
+    """
+    components = list(components)
+    paths = {}
+    if not components:
+        return paths
+
+    location = session.pick_location()
+    available = []
+    missing = []
+    if location is None:
+        missing = components
+    else:
+        availabilities = location.get_component_availabilities(components)
+        for component, availability in zip(components, availabilities):
+            if availability:
+                available.append(component)
+            else:
+                missing.append(component)
+
+    if available:
+        identifiers = location.get_resource_identifiers(available)
+        for component, identifier in zip(available, identifiers):
+            paths[component["id"]] = _get_filesystem_path(location, identifier)
+
+    for component in missing:
+        component_location = session.pick_location(component)
+        if component_location is None:
+            continue
+
+        paths[component["id"]] = _get_filesystem_path(
+            component_location,
+            component_location.get_resource_identifier(component)
+        )
+
+    if not first_frame:
+        return paths
+
+    # Format sequences with their first frame.
+    sequence_ids = [
+        component["id"] for component in components
+        if component.entity_type == "SequenceComponent" and
+        component["id"] in paths
+    ]
+    frames = {}
+    for member in query_in(
+        session,
+        "select name, container_id from Component where container_id in "
+        "({0})",
+        sequence_ids
+    ):
+        frame = int(member["name"])
+        container_id = member["container_id"]
+        frames[container_id] = min(frames.get(container_id, frame), frame)
+
+    for component_id, frame in frames.items():
+        paths[component_id] = paths[component_id] % frame
+
+    return paths
+
+
 def get_components(event, asset_types):
     # finding components
     data = []
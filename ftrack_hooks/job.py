@@ -0,0 +1,350 @@
+# :coding: utf-8
+import json
+import logging
+import os
+import socket
+import threading
+import time
+
+import ftrack_api
+
+
+def format_size(size):
+    '''Return *size* in bytes as human readable text.'''
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024:
+            return '{0:.1f} {1}'.format(size, unit)
+        size /= 1024.0
+
+    return '{0:.1f} TB'.format(size)
+
+
+def _format_duration(seconds):
+    '''Return *seconds* as human readable text.'''
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+
+    if hours:
+        return '{0}h {1}m'.format(hours, minutes)
+    if minutes:
+        return '{0}m {1}s'.format(minutes, seconds)
+    return '{0}s'.format(seconds)
+
+
+_writer_sessions = {}
+_writer_lock = threading.Lock()
+
+
+def _get_writer_session(session):
+    '''Return the session writing job progress for the user of *session*.
+
+    One session is shared by all jobs of a user, and only used while
+    holding `_writer_lock`.
+
+    '''
+    key = (session.server_url, session.api_user)
+
+    if key not in _writer_sessions:
+        _writer_sessions[key] = ftrack_api.Session(
+            server_url=session.server_url,
+            api_key=session.api_key,
+            api_user=session.api_user,
+            auto_connect_event_hub=False,
+            plugin_paths=[]
+        )
+
+    return _writer_sessions[key]
+
+
+def get_api_writer(session, job):
+    '''Return a writer setting the description of ftrack_api *job*.
+
+    The description is written through a separate session, so writing
+    progress from any thread neither uses *session* concurrently nor
+    commits its pending operations midway.
+
+    '''
+    job_id = job['id']
+
+    def write(description):
+        with _writer_lock:
+            writer = _get_writer_session(session)
+            try:
+                writer.get('Job', job_id)['data'] = json.dumps(
+                    {'description': description}
+                )
+                writer.commit()
+            except Exception:
+                writer.rollback()
+                raise
+
+    return write
+
+
+def attach_file(session, job, path):
+    '''Attach the file at *path* to ftrack_api *job* for download.'''
+    location = session.query(
+        'Location where name is "ftrack.server"'
+    ).one()
+    component = session.create_component(
+        path,
+        data={'name': os.path.splitext(os.path.basename(path))[0]},
+        location=location
+    )
+    session.create(
+        'JobComponent', {'component_id': component['id'], 'job_id': job['id']}
+    )
+    session.commit()
+
+
+def get_legacy_writer(job):
+    '''Return a writer setting the description of legacy ftrack *job*.'''
+    def write(description):
+        job.setDescription(description)
+
+    return write
+
+
+class JobProgress(object):
+    '''Report the progress of a job without writing on every update.
+
+    Progress can be updated as often as needed, from any thread. The job
+    description is written through `write` at most once every `interval`
+    seconds, and always on `finish`.
+
+    `description` is the text the progress is appended to, `total` the
+    amount of items and `total_bytes` the amount of bytes to process, if
+    known. The estimated time left is based on bytes when `total_bytes` is
+    known, and on items otherwise.
+
+    '''
+
+    def __init__(self, write, description, total=None, total_bytes=None,
+                 interval=2.0):
+        '''Expects a *write* callable receiving the description text.'''
+        self.logger = logging.getLogger(
+            '{0}.{1}'.format(__name__, self.__class__.__name__)
+        )
+
+        self.write = write
+        self.description = description
+        self.total = total
+        self.total_bytes = total_bytes
+        self.interval = interval
+
+        self.items = 0
+        self.bytes = 0
+        self.started = time.time()
+
+        self._written = 0
+        self._lock = threading.Lock()
+
+    def update(self, items=0, bytes=0, total=None, total_bytes=None):
+        '''Add *items* and *bytes* processed, and write if it is time to.
+
+        *total* and *total_bytes* replace the totals when given.
+
+        '''
+        with self._lock:
+            self.items += items
+            self.bytes += bytes
+
+            if total is not None:
+                self.total = total
+            if total_bytes is not None:
+                self.total_bytes = total_bytes
+
+            if time.time() - self._written < self.interval:
+                return
+
+            self._write()
+
+    def finish(self, message=None):
+        '''Write the final progress, followed by an optional *message*.'''
+        with self._lock:
+            self._write(message)
+
+    def format(self):
+        '''Return the description with the current progress.'''
+        parts = []
+
+        if self.total:
+            parts.append('{0}/{1}'.format(self.items, self.total))
+        elif self.items:
+            parts.append(str(self.items))
+
+        elapsed = time.time() - self.started
+        if self.bytes:
+            parts.append(format_size(self.bytes))
+
+            if elapsed > 0:
+                parts.append(
+                    '{0}/s'.format(format_size(self.bytes / elapsed))
+                )
+
+        remaining = None
+        if self.total_bytes and self.bytes:
+            remaining = (
+                elapsed * (self.total_bytes - self.bytes) / float(self.bytes)
+            )
+        elif self.total and self.items:
+            remaining = (
+                elapsed * (self.total - self.items) / float(self.items)
+            )
+
+        if remaining is not None and remaining > 0:
+            parts.append('ETA {0}'.format(_format_duration(remaining)))
+
+        if not parts:
+            return self.description
+
+        return '{0} ({1})'.format(self.description, ', '.join(parts))
+
+    def _write(self, message=None):
+        '''Write the current progress.'''
+        self._written = time.time()
+
+        description = self.format()
+        if message:
+            description = '{0} {1}'.format(description, message)
+
+        # Failing to report progress should not fail the job.
+        try:
+            self.write(description)
+        except Exception:
+            self.logger.exception('Failed to write job progress.')
+
+
+class JobTracker(object):
+    '''Track the jobs running in this process with a heartbeat file.
+
+    The ids of the tracked jobs are written to a heartbeat file named after
+    the host and process in `directory`, which is touched every `interval`
+    seconds while jobs are tracked. A heartbeat file that has not been
+    touched for a while belongs to a process that died, leaving its jobs
+    orphaned.
+
+    '''
+
+    def __init__(self, directory=None, interval=60):
+        '''Expects the *directory* to write heartbeat files to.'''
+        self.logger = logging.getLogger(
+            '{0}.{1}'.format(__name__, self.__class__.__name__)
+        )
+
+        if directory is None:
+            directory = os.environ.get(
+                'FTRACK_HOOKS_JOBS',
+                os.path.join(os.path.expanduser('~'), '.ftrack_hooks', 'jobs')
+            )
+
+        self.directory = directory
+        self.interval = interval
+        self.path = os.path.join(
+            directory, '{0}-{1}.json'.format(socket.gethostname(), os.getpid())
+        )
+
+        self._job_ids = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def track(self, job_id):
+        '''Track *job_id* until it is released.'''
+        with self._lock:
+            self._job_ids.add(job_id)
+            self._write()
+
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._beat)
+                self._thread.daemon = True
+                self._thread.start()
+
+    def release(self, job_id):
+        '''Stop tracking *job_id*.'''
+        with self._lock:
+            self._job_ids.discard(job_id)
+            self._write()
+
+    def _write(self):
+        '''Write the tracked job ids, or remove the file if there are none.'''
+        try:
+            if not self._job_ids:
+                if os.path.exists(self.path):
+                    os.remove(self.path)
+                return
+
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+
+            with open(self.path, 'w') as f:
+                json.dump(sorted(self._job_ids), f)
+        except (IOError, OSError):
+            self.logger.exception('Failed to write heartbeat.')
+
+    def _beat(self):
+        '''Touch the heartbeat file every `interval` seconds.'''
+        while True:
+            time.sleep(self.interval)
+
+            with self._lock:
+                if not self._job_ids:
+                    continue
+
+                try:
+                    os.utime(self.path, None)
+                except OSError:
+                    self._write()
+
+    def get_orphaned(self, timeout):
+        '''Return the orphaned heartbeat files and their job ids.
+
+        A heartbeat file is orphaned when it has not been touched for
+        *timeout* seconds. Returns a list of (path, job ids) tuples.
+
+        '''
+        if not os.path.isdir(self.directory):
+            return []
+
+        orphaned = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if path == self.path or not name.endswith('.json'):
+                continue
+
+            try:
+                if time.time() - os.path.getmtime(path) < timeout:
+                    continue
+
+                with open(path) as f:
+                    job_ids = json.load(f)
+            except (IOError, OSError, ValueError):
+                continue
+
+            orphaned.append((path, job_ids))
+
+        return orphaned
+
+
+_tracker = None
+_tracker_lock = threading.Lock()
+
+
+def get_tracker():
+    '''Return the job tracker of this process.'''
+    global _tracker
+
+    with _tracker_lock:
+        if _tracker is None:
+            _tracker = JobTracker()
+
+    return _tracker
+
+
+def track_job(job_id):
+    '''Track *job_id* as running in this process.'''
+    get_tracker().track(job_id)
+
+
+def release_job(job_id):
+    '''Stop tracking *job_id* once it has finished.'''
+    get_tracker().release(job_id)
@@ -0,0 +1,159 @@
+# :coding: utf-8
+import os
+import struct
+import threading
+
+
+#: Atoms of QuickTime files containing the track headers.
+CONTAINER_ATOMS = (b'moov', b'trak')
+
+
+def _probe_png(f):
+    '''Return the resolution from the IHDR chunk of a png.'''
+    f.seek(16)
+    return struct.unpack('>II', f.read(8))
+
+
+def _probe_exr(f):
+    '''Return the resolution from the dataWindow attribute of an exr.'''
+    f.seek(8)
+    while True:
+        name = _read_string(f)
+        if not name:
+            raise ValueError('No dataWindow attribute found.')
+
+        _read_string(f)
+        size = struct.unpack('<i', f.read(4))[0]
+
+        if name != b'dataWindow':
+            f.seek(size, os.SEEK_CUR)
+            continue
+
+        x_min, y_min, x_max, y_max = struct.unpack('<iiii', f.read(16))
+        return x_max - x_min + 1, y_max - y_min + 1
+
+
+def _read_string(f):
+    '''Return the null terminated string at the position of *f*.'''
+    characters = []
+    while True:
+        character = f.read(1)
+        if not character:
+            raise ValueError('Unexpected end of header.')
+        if character == b'\0':
+            return b''.join(characters)
+        characters.append(character)
+
+
+def _probe_dpx(f, endian):
+    '''Return the resolution from the image header of a dpx.'''
+    f.seek(772)
+    return struct.unpack(endian + 'II', f.read(8))
+
+
+def _probe_mov(f):
+    '''Return the resolution from the first video track header of a mov.'''
+    end = os.fstat(f.fileno()).st_size
+    position = 0
+    ends = [end]
+
+    while ends:
+        if position + 8 > ends[-1]:
+            position = ends.pop()
+            continue
+
+        f.seek(position)
+        size, atom = struct.unpack('>I4s', f.read(8))
+        header = 8
+        if size == 1:
+            size = struct.unpack('>Q', f.read(8))[0]
+            header = 16
+        elif size == 0:
+            size = ends[-1] - position
+
+        if size < header:
+            raise ValueError('Invalid atom size.')
+
+        if atom in CONTAINER_ATOMS:
+            ends.append(position + size)
+            position += header
+            continue
+
+        if atom == b'tkhd':
+            version = ord(f.read(1))
+            # Skip flags, times, track id and duration to the dimensions.
+            f.seek(3 + (32 if version == 1 else 20) + 52, os.SEEK_CUR)
+            width, height = struct.unpack('>II', f.read(8))
+            if width and height:
+                return width >> 16, height >> 16
+
+        position += size
+
+    raise ValueError('No video track found.')
+
+
+def read_resolution(path):
+    '''Return the (width, height) of the image or movie at *path*.
+
+    Only the header is read. Supports png, exr, dpx and QuickTime/mp4,
+    detected by their magic numbers. Raises a ValueError for other
+    formats.
+
+    '''
+    with open(path, 'rb') as f:
+        magic = f.read(12)
+
+        if magic.startswith(b'\x89PNG'):
+            return tuple(_probe_png(f))
+        if magic.startswith(b'\x76\x2f\x31\x01'):
+            return tuple(_probe_exr(f))
+        if magic.startswith(b'SDPX'):
+            return tuple(_probe_dpx(f, '>'))
+        if magic.startswith(b'XPDS'):
+            return tuple(_probe_dpx(f, '<'))
+        if magic[4:8] in (
+            b'ftyp', b'moov', b'mdat', b'wide', b'free', b'skip', b'pnot'
+        ):
+            return tuple(_probe_mov(f))
+
+    raise ValueError('Unsupported format "{0}".'.format(path))
+
+
+class ResolutionCache(object):
+    '''Cache resolutions by path and modification time.
+
+    *fallback* is an optional callable reading the resolution of formats
+    `read_resolution` does not support. At most `size` resolutions are
+    cached.
+
+    '''
+
+    def __init__(self, fallback=None, size=10000):
+        self.fallback = fallback
+        self.size = size
+
+        self._resolutions = {}
+        self._lock = threading.Lock()
+
+    def get(self, path):
+        '''Return the (width, height) of *path*.'''
+        key = (os.path.normcase(os.path.abspath(path)), os.path.getmtime(path))
+
+        with self._lock:
+            resolution = self._resolutions.get(key)
+        if resolution is not None:
+            return resolution
+
+        try:
+            resolution = read_resolution(path)
+        except (ValueError, struct.error):
+            if self.fallback is None:
+                raise
+            resolution = tuple(self.fallback(path))
+
+        with self._lock:
+            if len(self._resolutions) >= self.size:
+                self._resolutions.clear()
+            self._resolutions[key] = resolution
+
+        return resolution
@@ -0,0 +1,190 @@
+# :coding: utf-8
+import io
+import os
+import tempfile
+import traceback
+import uuid
+
+from ftrack_hooks.job import attach_file
+from ftrack_hooks.query import chunks, query_in
+
+
+def get_task_path(task):
+    '''Return the path of ftrack_api *task* from its link.'''
+    return '/'.join(link['name'] for link in task['link'])
+
+
+class VersionPublisher(object):
+    '''Create published versions for many tasks in chunked commits.
+
+    Tasks, asset types and the existing assets under the parents of the
+    tasks are looked up in bulk. Versions are created in commits of
+    `chunk_size`, and a chunk failing to commit is retried one version at a
+    time, so one bad task does not fail the others.
+
+    `progress` is an optional `ftrack_hooks.job.JobProgress` receiving an
+    item per task done.
+
+    '''
+
+    def __init__(self, session, chunk_size=50, progress=None):
+        self.session = session
+        self.chunk_size = chunk_size
+        self.progress = progress
+
+        self._tasks = {}
+        self._types = {}
+        self._assets = {}
+
+    def publish(self, requests):
+        '''Create a published version per request and return the results.
+
+        *requests* is a list of dictionaries with the `task_id` to create
+        the version for, the asset type `short` name and optionally the
+        `name` of the asset under the parent of the task to create it in,
+        defaulting to the task name, and the version `number`. Missing
+        assets are created.
+
+        Returns a dictionary per request with the `task` path, the created
+        `version` number and the `error`, which is None on success.
+
+        '''
+        self._prefetch(requests)
+
+        results = []
+        for chunk in chunks(requests, self.chunk_size):
+            created = []
+            try:
+                versions = [
+                    self._create(request, created) for request in chunk
+                ]
+                self.session.commit()
+            except Exception:
+                self._rollback(created)
+
+                # Retry one at a time to isolate the failing versions.
+                for request in chunk:
+                    results.append(self._publish_one(request))
+            else:
+                for request, version in zip(chunk, versions):
+                    results.append(self._get_result(request, version))
+
+            if self.progress:
+                self.progress.update(items=len(chunk))
+
+        return results
+
+    def _prefetch(self, requests):
+        '''Look up the tasks, asset types and assets of *requests*.'''
+        for task in query_in(
+            self.session,
+            'select name, parent, parent_id, link from Task where id in ({0})',
+            set(request['task_id'] for request in requests)
+        ):
+            self._tasks[task['id']] = task
+
+        for asset_type in query_in(
+            self.session,
+            'select short from AssetType where short in ({0})',
+            set(request['short'] for request in requests)
+        ):
+            self._types[asset_type['short']] = asset_type
+
+        for asset in query_in(
+            self.session,
+            'select name, parent_id, type_id from Asset where parent_id in '
+            '({0})',
+            set(task['parent_id'] for task in self._tasks.values())
+        ):
+            key = (asset['parent_id'], asset['name'], asset['type_id'])
+            self._assets[key] = asset
+
+    def _create(self, request, created):
+        '''Create the version of *request*, noting new assets in *created*.'''
+        task = self._tasks.get(request['task_id'])
+        if task is None:
+            raise ValueError(
+                'Task "{0}" does not exist.'.format(request['task_id'])
+            )
+
+        asset_type = self._types.get(request['short'])
+        if asset_type is None:
+            raise ValueError(
+                'Asset type "{0}" does not exist.'.format(request['short'])
+            )
+
+        name = request.get('name') or task['name']
+        key = (task['parent_id'], name, asset_type['id'])
+        asset = self._assets.get(key)
+        if asset is None:
+            asset = self.session.create('Asset', {
+                'name': name,
+                'type': asset_type,
+                'parent': task['parent']
+            })
+            self._assets[key] = asset
+            created.append(key)
+
+        data = {'asset': asset, 'task': task, 'is_published': True}
+        if request.get('number') is not None:
+            data['version'] = int(request['number'])
+
+        return self.session.create('AssetVersion', data)
+
+    def _rollback(self, created):
+        '''Roll back the session and forget the assets in *created*.'''
+        self.session.rollback()
+        for key in created:
+            self._assets.pop(key, None)
+
+    def _publish_one(self, request):
+        '''Create and commit the version of a single *request*.'''
+        created = []
+        try:
+            version = self._create(request, created)
+            self.session.commit()
+        except Exception:
+            self._rollback(created)
+            return self._get_result(request, error=traceback.format_exc())
+
+        return self._get_result(request, version)
+
+    def _get_result(self, request, version=None, error=None):
+        '''Return the result of *request*.'''
+        task = self._tasks.get(request['task_id'])
+        return {
+            'task': get_task_path(task) if task else request['task_id'],
+            'version': version['version'] if version is not None else None,
+            'error': error
+        }
+
+
+def format_results(results):
+    '''Return the text summary of publish *results*.'''
+    failed = len([result for result in results if result['error']])
+    return '{0} versions created, {1} failed.'.format(
+        len(results) - failed, failed
+    )
+
+
+def attach_results(session, job, results):
+    '''Attach the per task publish *results* to ftrack_api *job*.'''
+    path = os.path.join(
+        tempfile.gettempdir(), 'publish_results_{0}.txt'.format(uuid.uuid4())
+    )
+
+    with io.open(path, 'w', encoding='utf-8') as f:
+        for result in results:
+            if result['error']:
+                f.write(u'{0}: failed\n{1}\n'.format(
+                    result['task'], result['error']
+                ))
+            else:
+                f.write(u'{0}: v{1} created\n'.format(
+                    result['task'], str(result['version']).zfill(3)
+                ))
+
+    try:
+        attach_file(session, job, path)
+    finally:
+        os.remove(path)
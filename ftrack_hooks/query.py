@@ -0,0 +1,33 @@
+# :coding: utf-8
+
+
+def chunks(items, size):
+    '''Yield lists of at most *size* items from *items*.'''
+    chunk = []
+    for item in items:
+        chunk.append(item)
+
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+
+    if chunk:
+        yield chunk
+
+
+def format_ids(ids):
+    '''Return *ids* quoted and comma separated for an "in" expression.'''
+    return ', '.join('"{0}"'.format(entity_id) for entity_id in ids)
+
+
+def query_in(session, expression, ids, size=100):
+    '''Yield the entities matching *expression* for *ids*.
+
+    *expression* is formatted with a chunk of at most *size* ids at a time,
+    ie. 'select name from Status where id in ({0})', so large selections do
+    not exceed the length of a single query.
+
+    '''
+    for chunk in chunks(ids, size):
+        for entity in session.query(expression.format(format_ids(chunk))):
+            yield entity
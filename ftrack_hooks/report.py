@@ -0,0 +1,101 @@
+# :coding: utf-8
+import csv
+import json
+import sys
+
+
+#: Formats reports can be written in, and their file extensions.
+FORMATS = {'text': '.txt', 'csv': '.csv', 'json': '.json'}
+
+PY2 = sys.version_info[0] < 3
+
+try:
+    text_type = unicode
+except NameError:
+    text_type = str
+
+
+def _to_native(value):
+    '''Return *value* as a native string, encoding unicode on Python 2.'''
+    if PY2 and isinstance(value, text_type):
+        return value.encode('utf-8')
+
+    return value
+
+
+def open_report(path, format):
+    '''Return *path* opened for writing a report in *format*.'''
+    if format == 'csv':
+        if PY2:
+            return open(path, 'wb')
+        return open(path, 'w', newline='')
+
+    return open(path, 'w')
+
+
+class Report(object):
+    '''Stream the records of a report to a file as text, CSV or JSON.
+
+    Records are written as soon as they are added, so a report is never
+    held in memory as a whole.
+
+    *text* is a callable receiving a record and yielding the chunks of text
+    to write for it. *rows* is a callable receiving a record and yielding
+    dictionaries with the keys in *fields*, one per CSV row. JSON reports
+    are a list of the records, which have to be serialisable.
+
+    '''
+
+    def __init__(self, f, format='text', text=None, rows=None, fields=None):
+        '''Expects *f* opened with `open_report`.'''
+        if format not in FORMATS:
+            raise ValueError('Unknown report format "{0}".'.format(format))
+
+        self.f = f
+        self.format = format
+        self.text = text
+        self.rows = rows
+        self.fields = fields
+
+        self._count = 0
+        self._csv = None
+
+        if format == 'csv':
+            self._csv = csv.DictWriter(
+                f, [_to_native(field) for field in fields],
+                extrasaction='ignore'
+            )
+            self._csv.writeheader()
+        elif format == 'json':
+            f.write('[')
+
+    def write(self, record):
+        '''Write *record*.'''
+        if self.format == 'text':
+            for chunk in self.text(record):
+                self.f.write(_to_native(chunk))
+        elif self.format == 'csv':
+            for row in self.rows(record):
+                self._csv.writerow(dict(
+                    (_to_native(key), _to_native(value))
+                    for key, value in row.items()
+                ))
+        else:
+            if self._count:
+                self.f.write(',')
+            self.f.write('\n' + json.dumps(
+                record, indent=2, separators=(',', ': ')
+            ))
+
+        self._count += 1
+
+    def close(self):
+        '''Finish the report.'''
+        if self.format == 'json':
+            self.f.write('\n]\n')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,164 @@
+# :coding: utf-8
+import contextlib
+import errno
+import logging
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import uuid
+
+
+def _is_running(pid):
+    '''Return whether process *pid* is running, or None when unknown.'''
+    if os.name == 'nt':
+        # os.kill terminates the process on Windows, so it can not be used
+        # to probe for liveness.
+        return None
+
+    try:
+        os.kill(pid, 0)
+    except OSError as error:
+        return error.errno == errno.EPERM
+
+    return True
+
+
+class ScratchSpace(object):
+    '''Per process scratch space with an optional disk budget.
+
+    Scratch directories are allocated below *root*/*name*/<host>-<pid>-<id>,
+    so directories left behind by a process that died can be swept by the
+    next process using the same *name*, even when *root* is shared by
+    several hosts.
+
+    `budget` is the maximum amount of bytes reserved at once. Allocating
+    blocks until enough of the budget has been released, which throttles
+    producers like downloads. A single allocation larger than the budget is
+    let through when nothing else is reserved.
+
+    `max_age` is the amount of seconds after which a scratch directory is
+    considered orphaned when the liveness of its owning process can not be
+    determined, ie. when it belongs to another host.
+
+    '''
+
+    def __init__(self, name, root=None, budget=None, max_age=86400):
+        '''Expects a *name* to group the scratch directories under.'''
+        self.logger = logging.getLogger(
+            '{0}.{1}'.format(__name__, self.__class__.__name__)
+        )
+
+        if root is None:
+            root = os.environ.get(
+                'FTRACK_HOOKS_SCRATCH', tempfile.gettempdir()
+            )
+
+        self.root = os.path.join(root, 'ftrack_hooks', name)
+        self.budget = budget
+        self.max_age = max_age
+        self.reserved = 0
+
+        self._host = socket.gethostname().replace('-', '_')
+        self._prefix = '{0}-{1}-'.format(self._host, os.getpid())
+        self._condition = threading.Condition()
+
+    def sweep(self):
+        '''Remove scratch directories left behind by dead processes.'''
+        if not os.path.isdir(self.root):
+            return
+
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+
+            if name.startswith(self._prefix):
+                continue
+
+            # Directories of earlier versions have no host.
+            parts = name.rsplit('-', 2)
+            if len(parts) == 2:
+                parts.insert(0, None)
+            if len(parts) != 3:
+                continue
+
+            host, pid = parts[:2]
+            try:
+                pid = int(pid)
+            except ValueError:
+                continue
+
+            # Processes of other hosts can not be probed.
+            running = None
+            if host == self._host:
+                running = _is_running(pid)
+
+            if running is None:
+                try:
+                    age = time.time() - os.path.getmtime(path)
+                except OSError:
+                    continue
+
+                running = age < self.max_age
+
+            if running:
+                continue
+
+            self.logger.info('Removing orphaned scratch "{0}".'.format(path))
+            shutil.rmtree(path, ignore_errors=True)
+
+    def reserve(self, size):
+        '''Block until *size* bytes fit within the budget and reserve them.'''
+        size = max(int(size or 0), 0)
+
+        with self._condition:
+            if self.budget:
+                while (
+                    self.reserved and
+                    self.reserved + size > self.budget
+                ):
+                    self._condition.wait()
+
+            self.reserved += size
+
+        return size
+
+    def release(self, size):
+        '''Release *size* bytes previously reserved.'''
+        with self._condition:
+            self.reserved = max(self.reserved - size, 0)
+            self._condition.notify_all()
+
+    def create(self, size=0):
+        '''Return a new scratch directory reserving *size* bytes.
+
+        The directory must be handed back to `remove` with the same *size*.
+
+        '''
+        self.reserve(size)
+
+        path = os.path.join(self.root, self._prefix + uuid.uuid4().hex)
+        try:
+            os.makedirs(path)
+        except:
+            self.release(size)
+            raise
+
+        return path
+
+    def remove(self, path, size=0):
+        '''Remove scratch directory *path* and release *size* bytes.'''
+        try:
+            shutil.rmtree(path, ignore_errors=True)
+        finally:
+            self.release(size)
+
+    @contextlib.contextmanager
+    def allocate(self, size=0):
+        '''Yield a scratch directory reserving *size* bytes while in use.'''
+        path = self.create(size)
+        try:
+            yield path
+        finally:
+            self.remove(path, size)
@@ -0,0 +1,105 @@
+# :coding: utf-8
+import os
+import threading
+
+import clique
+
+
+class SequenceScanner(object):
+    '''Find the members of file sequences, listing each directory once.
+
+    Directory listings are cached for the lifetime of the scanner, so a
+    scanner is meant to live as long as a single job. Call `clear` to
+    forget the listings.
+
+    '''
+
+    def __init__(self):
+        self._listings = {}
+        self._lock = threading.Lock()
+
+    def clear(self):
+        '''Forget all cached directory listings.'''
+        with self._lock:
+            self._listings.clear()
+
+    def listdir(self, directory):
+        '''Return the cached names of the entries in *directory*.
+
+        Entries are not stat'ed, the frame pattern of a sequence tells its
+        members from other entries.
+
+        '''
+        key = os.path.normcase(os.path.abspath(directory))
+
+        with self._lock:
+            names = self._listings.get(key)
+
+        if names is None:
+            names = os.listdir(directory)
+            with self._lock:
+                self._listings[key] = names
+
+        return names
+
+    def get_members(self, path):
+        '''Return the paths of the members of the sequence at *path*.
+
+        *path* is a sequence path with a frame pattern, ie.
+        "/renders/shot.%04d.exr". Members are the files in the same
+        directory matching the pattern, ordered by frame. Paths without a
+        frame pattern are their own only member, if the file exists.
+
+        '''
+        directory = os.path.dirname(path)
+
+        try:
+            collection = clique.parse(path, '{head}{padding}{tail}')
+        except ValueError:
+            if os.path.basename(path) in self.listdir(directory):
+                return [path]
+            return []
+
+        members = []
+        for name in self.listdir(directory):
+            member = os.path.join(directory, name)
+            match = collection.match(member)
+            if match:
+                members.append((int(match.group('index')), member))
+
+        return [member_path for index, member_path in sorted(members)]
+
+    def get_first_member(self, path):
+        '''Return the path of the first member of the sequence at *path*.
+
+        Raises a ValueError if the sequence has no members.
+
+        '''
+        members = self.get_members(path)
+        if not members:
+            raise ValueError('No files found for "{0}".'.format(path))
+
+        return members[0]
+
+
+def scan_sequences(root):
+    '''Yield the sequences and single files found below *root*.
+
+    Every directory is listed once. Files numbered by frame, ie.
+    "shot.0001.exr", are yielded as clique collections, even a single frame,
+    and all other files as paths.
+
+    '''
+    for directory, directories, names in os.walk(root):
+        directories.sort()
+
+        collections, remainder = clique.assemble(
+            sorted(names), patterns=[clique.PATTERNS['frames']],
+            minimum_items=1
+        )
+        for collection in collections:
+            collection.head = os.path.join(directory, collection.head)
+            yield collection
+
+        for name in remainder:
+            yield os.path.join(directory, name)
@@ -0,0 +1,263 @@
+# :coding: utf-8
+import logging
+import multiprocessing
+import os
+import subprocess
+import sys
+import threading
+import traceback
+
+from PIL import Image, ImageDraw, ImageFont
+
+from ftrack_hooks.probe import ResolutionCache
+
+
+#: Fonts tried in order, the first one found is used.
+FONTS = (
+    'arial.ttf', 'Arial.ttf', 'DejaVuSans.ttf', 'LiberationSans-Regular.ttf'
+)
+
+#: Colour of the text and of the box behind it.
+TEXT_COLOUR = (255, 255, 255, 255)
+BOX_COLOUR = (0, 0, 0, 128)
+
+#: Distance of the text from the top and bottom edges.
+MARGIN = 5
+
+#: Directory of the ImageMagick executables, for sources Pillow can not read.
+#: ImageMagick is looked up on the PATH if it is not set.
+IMAGEMAGICK_DIR = os.environ.get('FTRACK_HOOKS_IMAGEMAGICK')
+
+logger = logging.getLogger(__name__)
+
+
+_fonts = {}
+
+
+def get_font(size):
+    '''Return a font of *size* points.
+
+    The font is read from FTRACK_HOOKS_TITLE_FONT if set, else the first of
+    `FONTS` found. Fonts are cached per size.
+
+    '''
+    if size not in _fonts:
+        _fonts[size] = _load_font(size)
+
+    return _fonts[size]
+
+
+def _load_font(size):
+    '''Return the first font found of *size* points.'''
+    names = list(FONTS)
+    if os.environ.get('FTRACK_HOOKS_TITLE_FONT'):
+        names.insert(0, os.environ['FTRACK_HOOKS_TITLE_FONT'])
+
+    for name in names:
+        try:
+            return ImageFont.truetype(name, size)
+        except IOError:
+            continue
+
+    return ImageFont.load_default()
+
+
+def _read_image_size(path):
+    '''Return the (width, height) of *path* read by Pillow or ImageMagick.'''
+    try:
+        image = Image.open(path)
+    except IOError:
+        return _identify(path)
+
+    try:
+        return image.size
+    finally:
+        close = getattr(image, 'close', None)
+        if close is not None:
+            close()
+
+
+def _identify(path):
+    '''Return the (width, height) of *path* read by ImageMagick identify.
+
+    Raises IOError if ImageMagick is not found or can not read *path*.
+
+    '''
+    executable = 'identify'
+    if IMAGEMAGICK_DIR:
+        executable = os.path.join(IMAGEMAGICK_DIR, executable)
+        if os.name == 'nt':
+            executable += '.exe'
+
+    try:
+        output = subprocess.check_output(
+            [executable, '-format', '%wx%h', '{0}[0]'.format(path)]
+        )
+    except (OSError, subprocess.CalledProcessError):
+        raise IOError('Unsupported image format: {0}'.format(path))
+
+    width, height = output.strip().split('x')
+    return int(width), int(height)
+
+
+_resolutions = ResolutionCache(fallback=_read_image_size)
+
+
+def get_resolution(path):
+    '''Return the (width, height) of the image or movie at *path*.
+
+    Only the header is read, and resolutions are cached by path and
+    modification time.
+
+    '''
+    return _resolutions.get(path)
+
+
+_templates = {}
+_templates_lock = threading.Lock()
+
+
+def get_template(resolution):
+    '''Return a new blank overlay of *resolution*.
+
+    Blank overlays are cached per resolution and copied.
+
+    '''
+    resolution = tuple(resolution)
+
+    with _templates_lock:
+        template = _templates.get(resolution)
+        if template is None:
+            template = Image.new('RGBA', resolution, (0, 0, 0, 0))
+            _templates[resolution] = template
+
+        return template.copy()
+
+
+def _get_text_size(draw, text, font):
+    '''Return the (width, height) of *text* drawn with *font*.
+
+    The height spans the ascent and descent of *font*, so boxes of texts
+    with and without descenders line up.
+
+    '''
+    if hasattr(draw, 'textbbox'):
+        width = draw.textbbox((0, 0), text, font=font)[2]
+    else:
+        width = draw.textsize(text, font=font)[0]
+
+    if hasattr(font, 'getmetrics'):
+        ascent, descent = font.getmetrics()
+        return width, ascent + descent
+
+    return width, draw.textsize(text, font=font)[1]
+
+
+def _annotate(draw, text, font, gravity, resolution):
+    '''Draw *text* on a box at the *gravity* corner of *resolution*.'''
+    text = ' {0} '.format(text)
+    width, height = resolution
+    text_width, text_height = _get_text_size(draw, text, font)
+
+    x = 0
+    if gravity.endswith('East'):
+        x = width - text_width
+
+    y = MARGIN
+    if gravity.startswith('South'):
+        y = height - text_height - MARGIN
+
+    draw.rectangle(
+        (x, y, x + text_width - 1, y + text_height - 1), fill=BOX_COLOUR
+    )
+    draw.text((x, y), text, font=font, fill=TEXT_COLOUR)
+
+
+def render_title(output_file, input_file, size, south_west_text,
+                 south_east_text, north_west_text, resolution=None):
+    '''Render a title for *input_file* to the png *output_file*.
+
+    The title is a transparent image of the resolution of *input_file*
+    with white text of *size* points on translucent boxes in the bottom
+    left, bottom right and top left corners. Pass the *resolution* if it
+    is known already.
+
+    '''
+    if resolution is None:
+        resolution = get_resolution(input_file)
+    resolution = tuple(resolution)
+    font = get_font(int(size))
+
+    image = get_template(resolution)
+    draw = ImageDraw.Draw(image)
+    _annotate(draw, south_west_text, font, 'SouthWest', resolution)
+    _annotate(draw, south_east_text, font, 'SouthEast', resolution)
+    _annotate(draw, north_west_text, font, 'NorthWest', resolution)
+
+    image.save(output_file, 'PNG')
+
+
+def _render(arguments):
+    '''Render a title from *arguments* and return the error, if any.'''
+    try:
+        render_title(*arguments)
+    except Exception:
+        return arguments, traceback.format_exc()
+
+    return arguments, None
+
+
+def get_processes():
+    '''Return the amount of processes to render titles in.
+
+    Titles are rendered in this process unless FTRACK_HOOKS_TITLE_PROCESSES
+    is set to more than one process, or to 0 for a process per CPU.
+    Starting processes from the threads of a Connect plugin re-launches the
+    host on Windows and in frozen executables, so those always render in
+    this process.
+
+    '''
+    if os.name == 'nt' or getattr(sys, 'frozen', False):
+        return 1
+
+    try:
+        processes = int(os.environ.get('FTRACK_HOOKS_TITLE_PROCESSES', 1))
+    except ValueError:
+        logger.warning('Invalid FTRACK_HOOKS_TITLE_PROCESSES, using 1.')
+        return 1
+
+    if processes <= 0:
+        processes = multiprocessing.cpu_count()
+
+    return processes
+
+
+def render_titles(titles, processes=None):
+    '''Render *titles* and yield the results.
+
+    *titles* is a list of `render_title` argument tuples. Yields an
+    (arguments, error) tuple for every title as it finishes, where error
+    is the traceback of a failed title or None. *processes* defaults to
+    `get_processes`, a single process renders in this process.
+
+    '''
+    titles = list(titles)
+    if not titles:
+        return
+
+    if processes is None:
+        processes = get_processes()
+    processes = min(processes, len(titles))
+
+    if processes <= 1:
+        for arguments in titles:
+            yield _render(arguments)
+        return
+
+    pool = multiprocessing.Pool(processes)
+    try:
+        for result in pool.imap_unordered(_render, titles):
+            yield result
+    finally:
+        pool.terminate()
+        pool.join()
@@ -0,0 +1,315 @@
+# :coding: utf-8
+import collections
+import errno
+import hashlib
+import logging
+import os
+import shutil
+import threading
+import time
+import traceback
+
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+#: Modes to transfer files with.
+MODES = ('copy', 'hardlink', 'symlink', 'reflink')
+
+#: Size of the chunks files are copied in.
+CHUNK_SIZE = 1024 * 1024
+
+#: Linux ioctl cloning the extents of a file on copy-on-write filesystems.
+FICLONE = 0x40049409
+
+#: Errors meaning the filesystem does not support an operation.
+UNSUPPORTED = set([
+    errno.EXDEV, errno.EINVAL, errno.ENOSYS, errno.ENOTTY, errno.EPERM,
+    getattr(errno, 'EOPNOTSUPP', errno.EINVAL),
+    getattr(errno, 'ENOTSUP', errno.EINVAL)
+])
+
+
+def copy_file(src, dst):
+    '''Copy *src* to *dst* preserving the modification time.'''
+    with open(src, 'rb') as fsrc:
+        with open(dst, 'wb') as fdst:
+            shutil.copyfileobj(fsrc, fdst, CHUNK_SIZE)
+
+    shutil.copystat(src, dst)
+
+
+def reflink_file(src, dst):
+    '''Clone *src* to *dst* sharing the data on copy-on-write filesystems.
+
+    Raises an OSError when the filesystem does not support cloning.
+
+    '''
+    if fcntl is None:
+        raise OSError(errno.ENOSYS, 'Reflinks are not supported.')
+
+    try:
+        with open(src, 'rb') as fsrc:
+            with open(dst, 'wb') as fdst:
+                fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+    except (IOError, OSError):
+        os.remove(dst)
+        raise
+
+    shutil.copystat(src, dst)
+
+
+def hardlink_file(src, dst):
+    '''Hardlink *src* to *dst*.'''
+    if not hasattr(os, 'link'):
+        raise OSError(errno.ENOSYS, 'Hardlinks are not supported.')
+
+    os.link(src, dst)
+
+
+def symlink_file(src, dst):
+    '''Symlink *src* to *dst*.'''
+    if not hasattr(os, 'symlink'):
+        raise OSError(errno.ENOSYS, 'Symlinks are not supported.')
+
+    os.symlink(os.path.abspath(src), dst)
+
+
+def get_checksum(path, chunk_size=1024 * 1024):
+    '''Return the md5 checksum of the file at *path*.'''
+    checksum = hashlib.md5()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            checksum.update(chunk)
+
+    return checksum.hexdigest()
+
+
+def is_identical(src, dst, verify='size', mode='copy'):
+    '''Return whether *dst* is an identical transfer of *src*.
+
+    Links are identical when they point to *src*. Copies are identical when
+    size and modification time match, and when *verify* is "hash" their
+    checksums have to match as well.
+
+    '''
+    if mode == 'symlink':
+        return (
+            os.path.islink(dst) and
+            os.readlink(dst) == os.path.abspath(src)
+        )
+
+    if os.path.islink(dst):
+        return False
+
+    try:
+        src_stat = os.stat(src)
+        dst_stat = os.stat(dst)
+    except OSError:
+        return False
+
+    if mode == 'hardlink':
+        return (
+            src_stat.st_ino == dst_stat.st_ino and
+            src_stat.st_dev == dst_stat.st_dev and
+            bool(src_stat.st_ino)
+        )
+
+    if src_stat.st_size != dst_stat.st_size:
+        return False
+
+    # Compare whole seconds, as not every filesystem stores fractions.
+    if int(src_stat.st_mtime) != int(dst_stat.st_mtime):
+        return False
+
+    if verify == 'hash':
+        return get_checksum(src) == get_checksum(dst)
+
+    return True
+
+
+class Transfer(object):
+    '''Copy files with a bounded pool of worker threads.
+
+    Destinations that are identical to their source are skipped, so an
+    interrupted transfer resumes where it stopped instead of starting
+    over. Copies preserve the modification time for that reason.
+
+    `mode` is one of `MODES`. Links and reflinks fall back to copying
+    when the filesystem does not support them, ie. across volumes.
+
+    `verify` is how identical files are detected, see `is_identical`.
+
+    `retries` is the amount of times a failed copy is retried, waiting
+    `retry_delay` seconds doubling with every attempt.
+
+    `progress` is an optional `ftrack_hooks.job.JobProgress` receiving an
+    item and its bytes for every file done.
+
+    '''
+
+    def __init__(self, workers=4, mode='copy', verify='size', retries=3,
+                 retry_delay=1.0, progress=None):
+        self.logger = logging.getLogger(
+            '{0}.{1}'.format(__name__, self.__class__.__name__)
+        )
+
+        if mode not in MODES:
+            raise ValueError('Unknown transfer mode "{0}".'.format(mode))
+
+        self.workers = max(int(workers), 1)
+        self.mode = mode
+        self.verify = verify
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.progress = progress
+
+        self.copied = 0
+        self.skipped = 0
+        self.bytes = 0
+        self.errors = []
+
+        self._transfers = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._fallbacks = set()
+
+    def add(self, src, dst):
+        '''Add a copy of *src* to *dst*, replacing earlier copies to *dst*.'''
+        self._transfers[os.path.normcase(os.path.abspath(dst))] = (src, dst)
+
+    def __len__(self):
+        return len(self._transfers)
+
+    def copy(self, src, dst):
+        '''Transfer *src* to *dst* with `mode`.'''
+
+        # Replace rather than write through existing links to the source.
+        if os.path.lexists(dst):
+            os.remove(dst)
+
+        if self.mode != 'copy':
+            transfer = {
+                'hardlink': hardlink_file,
+                'symlink': symlink_file,
+                'reflink': reflink_file
+            }[self.mode]
+
+            try:
+                transfer(src, dst)
+                return
+            except (IOError, OSError) as error:
+                if error.errno not in UNSUPPORTED:
+                    raise
+
+                self._warn_fallback(error)
+
+        copy_file(src, dst)
+
+    def _warn_fallback(self, error):
+        '''Warn once per error that `mode` falls back to copying.'''
+        with self._lock:
+            if error.errno in self._fallbacks:
+                return
+            self._fallbacks.add(error.errno)
+
+        self.logger.warning(
+            'Falling back to copying, {0} is not supported: {1}'.format(
+                self.mode, error
+            )
+        )
+
+    def run(self):
+        '''Copy all added files and return the list of errors.
+
+        Each error is a (source, destination, traceback) tuple.
+
+        '''
+        transfers = queue.Queue()
+        for transfer in self._transfers.values():
+            transfers.put(transfer)
+
+        threads = []
+        for index in range(min(self.workers, len(self._transfers))):
+            transfers.put(None)
+            thread = threading.Thread(target=self._work, args=(transfers,))
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+
+        for thread in threads:
+            thread.join()
+
+        self._transfers.clear()
+        return self.errors
+
+    def format(self):
+        '''Return the statistics of the transfer as text.'''
+        return 'Copied {0}, skipped {1} identical, {2} failed.'.format(
+            self.copied, self.skipped, len(self.errors)
+        )
+
+    def _work(self, transfers):
+        '''Copy transfers from the *transfers* queue until told to stop.'''
+        while True:
+            transfer = transfers.get()
+            if transfer is None:
+                return
+
+            src, dst = transfer
+            try:
+                size = self._transfer(src, dst)
+            except Exception:
+                with self._lock:
+                    self.errors.append((src, dst, traceback.format_exc()))
+                size = 0
+
+            if self.progress:
+                self.progress.update(items=1, bytes=size)
+
+    def _transfer(self, src, dst):
+        '''Copy *src* to *dst* unless identical and return the bytes.'''
+        if is_identical(src, dst, self.verify, self.mode):
+            with self._lock:
+                self.skipped += 1
+            return 0
+
+        directory = os.path.dirname(dst)
+        attempt = 0
+        while True:
+            try:
+                if not os.path.isdir(directory):
+                    try:
+                        os.makedirs(directory)
+                    except OSError as error:
+                        if error.errno != errno.EEXIST:
+                            raise
+
+                self.copy(src, dst)
+                break
+            except (IOError, OSError) as error:
+                # Missing sources are not transient.
+                if error.errno == errno.ENOENT or attempt >= self.retries:
+                    raise
+
+                delay = self.retry_delay * 2 ** attempt
+                self.logger.warning(
+                    'Copying "{0}" failed, retrying in {1}s: {2}'.format(
+                        src, delay, error
+                    )
+                )
+                time.sleep(delay)
+                attempt += 1
+
+        size = os.path.getsize(src)
+        with self._lock:
+            self.copied += 1
+            self.bytes += size
+
+        return size
@@ -2,37 +2,17 @@ import json
 import getpass
 
 import ftrack_api
-from ftrack_connect.session import get_shared_session
+from ftrack_hooks.dispatcher import get_dispatcher
+from ftrack_hooks.job import track_job, release_job
 
 
-def callback(event):
+def callback(session, updates):
+    """Version up the scene of tasks changed to "Pending Changes"."""
 
-    session = get_shared_session()
+    for update in updates:
 
-    for entity_data in event["data"].get("entities", []):
-
-        # Filter to tasks
-        if entity_data.get('entityType') != 'task':
-            continue
-
-        # Filter to updates
-        if entity_data['action'] != 'update':
-            continue
-
-        # Filter to status changes
-        if 'statusid' not in entity_data.get('keys'):
-            continue
-
-        # Filter to "Pending Changes"
-        new_status = session.get(
-            "Status", entity_data["changes"]["statusid"]["new"]
-        )
-
-        if new_status["name"].lower() != "pending changes":
-            continue
-
-        task = session.get("Task", entity_data["entityId"])
-        user = session.get("User", event["source"]["user"]["id"])
+        task = update["entity"]
+        user = session.get("User", update["event"]["source"]["user"]["id"])
         job = session.create(
             "Job",
             {
@@ -42,27 +22,28 @@ def callback(event):
             }
         )
         session.commit()
+        track_job(job["id"])
 
         try:
-            versions = session.query(
-                "select version,components,asset.name,asset.parent,"
-                "asset.type.id,asset.parent.id,asset.type.id from AssetVersion"
-                " where task.id is \"{0}\" and asset.type.short is "
-                "\"scene\"".format(task["id"])
-            )
-
-            latest_version = {"version": 0}
-            for version in versions:
-                if latest_version["version"] < version["version"]:
-                    latest_version = version
+            latest_version = session.query(
+                "select version,asset.name,asset.type.id,asset.parent.id "
+                "from AssetVersion where task.id is \"{0}\" and "
+                "asset.type.short is \"scene\" order by version "
+                "descending".format(task["id"])
+            ).first()
 
             # Skip if no scene version was found
-            if latest_version["version"] == 0:
+            if not latest_version:
                 job["status"] = "done"
                 continue
 
             # Skip if an empty scene version exists
-            if len(latest_version["components"]) == 0:
+            component = session.query(
+                "select id from Component where version.id is "
+                "\"{0}\"".format(latest_version["id"])
+            ).first()
+
+            if not component:
                 job["status"] = "done"
                 continue
 
@@ -111,8 +92,9 @@ def callback(event):
             job["status"] = "failed"
         else:
             job["status"] = "done"
-
-        session.commit()
+        finally:
+            session.commit()
+            release_job(job["id"])
 
 
 def register(session, **kw):
@@ -130,4 +112,5 @@ def register(session, **kw):
         "topic=ftrack.update and source.applicationId=ftrack.client.web and "
         "source.user.username={0}".format(getpass.getuser())
     )
-    session.event_hub.subscribe(subscription, callback)
+    dispatcher = get_dispatcher(session, subscription)
+    dispatcher.register(callback, statuses=["pending changes"])
@@ -1,9 +1,25 @@
 import sys
+import json
 import argparse
 import logging
 import getpass
+import threading
+import traceback
 
 import ftrack
+import ftrack_api
+from ftrack_hooks.job import (
+    JobProgress, format_size, get_api_writer, track_job, release_job
+)
+from ftrack_hooks.query import chunks, query_in
+
+
+def async(fn):
+    """Run *fn* asynchronously."""
+    def wrapper(*args, **kwargs):
+        thread = threading.Thread(target=fn, args=args, kwargs=kwargs)
+        thread.start()
+    return wrapper
 
 
 class AssetDelete(ftrack.Action):
@@ -50,55 +66,156 @@ class AssetDelete(ftrack.Action):
             }]
         }
 
+    def get_assets(self, session, entity_id):
+        """Return the assets of the project or task *entity_id*.
+
+        Assets are fetched with their type in a single query.
+        """
+        return session.query(
+            "select name, type.name from Asset where parent_id is \"{0}\" "
+            "or parent.ancestors.id is \"{0}\" or versions.task_id is "
+            "\"{0}\" order by name".format(entity_id)
+        ).all()
+
+    def get_preview(self, session, asset_ids):
+        """Return the amount of versions and bytes of *asset_ids*."""
+        versions = 0
+        for version in query_in(
+            session,
+            "select id from AssetVersion where asset_id in ({0})",
+            asset_ids
+        ):
+            versions += 1
+
+        size = 0
+        for component in query_in(
+            session,
+            "select size from Component where version.asset_id in ({0})",
+            asset_ids
+        ):
+            size += component["size"] or 0
+
+        return versions, size
+
+    @async
+    def delete_assets(self, event, asset_ids, chunk_size=50):
+        """Delete *asset_ids* in a job, committing *chunk_size* at a time."""
+        session = ftrack_api.Session()
+        user = session.query(
+            "User where username is \"{0}\"".format(
+                event["source"]["user"]["username"]
+            )
+        ).one()
+        job = session.create(
+            "Job",
+            {
+                "user": user,
+                "status": "running",
+                "data": json.dumps({"description": "Deleting assets."})
+            }
+        )
+        session.commit()
+        track_job(job["id"])
+
+        try:
+            progress = JobProgress(
+                get_api_writer(session, job), "Deleting assets.",
+                total=len(asset_ids)
+            )
+            try:
+                for chunk in chunks(asset_ids, chunk_size):
+                    for asset in query_in(
+                        session, "select id from Asset where id in ({0})",
+                        chunk
+                    ):
+                        session.delete(asset)
+
+                    session.commit()
+                    progress.update(items=len(chunk))
+            except:
+                self.logger.error(traceback.format_exc())
+                session.rollback()
+                job["status"] = "failed"
+            else:
+                job["status"] = "done"
+
+            progress.finish()
+            session.commit()
+        finally:
+            release_job(job["id"])
+
     def launch(self, event):
+        session = ftrack_api.Session()
+        entity_id = event["data"]["selection"][0]["entityId"]
+
         if "values" in event["data"]:
-            # Do something with the values or return a new form.
             values = event["data"]["values"]
 
-            success = True
-            msg = "Asset deleted."
+            # Deleting after confirmation, exactly the assets previewed.
+            if "confirm" in values:
+                if values["confirm"] != "yes":
+                    return {
+                        "success": True,
+                        "message": "Deleting assets cancelled."
+                    }
 
-            # deleting all assets
-            if values["asset"] == "all":
-                entity = None
-                try:
-                    entity = ftrack.Project(
-                        event["data"]["selection"][0]["entityId"]
-                    )
-                except:
-                    entity = ftrack.Task(
-                        event["data"]["selection"][0]["entityId"]
-                    )
-                for asset in entity.getAssets():
-                    asset.delete()
+                asset_ids = [
+                    asset_id for asset_id in values["asset_ids"].split(",")
+                    if asset_id
+                ]
+                self.delete_assets(event, asset_ids)
 
                 return {
-                    "success": success,
-                    "message": "All assets deleted."
+                    "success": True,
+                    "message": "Deleting {0} assets. Click Job for "
+                               "details.".format(len(asset_ids))
                 }
 
-            asset = ftrack.Asset(values["asset"])
-            asset.delete()
+            if values["asset"] == "all":
+                assets = self.get_assets(session, entity_id)
+                asset_ids = [asset["id"] for asset in assets]
+            else:
+                asset_ids = [values["asset"]]
 
+            # Previewing what will be deleted.
+            versions, size = self.get_preview(session, asset_ids)
             return {
-                "success": success,
-                "message": msg
+                "items": [
+                    {
+                        "type": "label",
+                        "value": "{0} assets with {1} versions and {2} of "
+                                 "components will be deleted.".format(
+                                     len(asset_ids), versions,
+                                     format_size(size)
+                                 )
+                    },
+                    {
+                        "type": "hidden",
+                        "name": "asset_ids",
+                        "value": ",".join(asset_ids)
+                    },
+                    {
+                        "label": "Delete",
+                        "type": "enumerator",
+                        "name": "confirm",
+                        "data": [
+                            {"label": "No", "value": "no"},
+                            {"label": "Yes", "value": "yes"}
+                        ],
+                        "value": "no"
+                    }
+                ]
             }
 
         data = []
-        entity = None
-        try:
-            entity = ftrack.Project(event["data"]["selection"][0]["entityId"])
-        except:
-            entity = ftrack.Task(event["data"]["selection"][0]["entityId"])
-        for asset in entity.getAssets():
-            if asset.getName():
+        for asset in self.get_assets(session, entity_id):
+            if asset["name"]:
                 name = "{0} ({1})".format(
-                    asset.getName(), asset.getType().getName()
+                    asset["name"], asset["type"]["name"]
                 )
-                data.append({"label": name, "value": asset.getId()})
+                data.append({"label": name, "value": asset["id"]})
             else:
-                data.append({"label": "None", "value": asset.getId()})
+                data.append({"label": "None", "value": asset["id"]})
 
         if len(data) > 1:
             data.append({"label": "All", "value": "all"})
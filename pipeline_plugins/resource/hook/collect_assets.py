@@ -6,7 +6,15 @@ import re
 import shutil
 import traceback
 import threading
-from ftrack_hooks.hook_utils import get_unique_component_names, get_file_for_component
+from ftrack_hooks.hook_utils import (
+    get_unique_component_names, get_files_for_components
+)
+from ftrack_hooks.job import (
+    JobProgress, get_legacy_writer, track_job, release_job
+)
+from ftrack_hooks.query import query_in
+from ftrack_hooks.sequence import SequenceScanner
+from ftrack_hooks.transfer import Transfer
 
 logging.basicConfig()
 logger = logging.getLogger()
@@ -16,6 +24,7 @@ if __name__ == "__main__":
     sys.path.append(os.path.join(tools_path, "ftrack", "ftrack-api"))
 
 import ftrack
+import ftrack_api
 
 
 def get_version(string, prefix, suffix=None):
@@ -55,6 +64,49 @@ def format_basename(src_file, formatting):
 
     return basename
 
+
+def prefetch_versions(session, version_ids, component_name):
+    """Return what is needed to collect *version_ids*, resolved in bulk.
+
+    Returns a dictionary of version id to a dictionary with the `parents`
+    names from the project down to the asset, the asset `type` short name
+    and the `path` of the component named *component_name*, which is None
+    when the version has no such component. Sequence paths keep their frame
+    pattern.
+    """
+    versions = {}
+    for version in query_in(
+        session,
+        "select asset.name, asset.type.short, asset.parent.link "
+        "from AssetVersion where id in ({0})",
+        version_ids
+    ):
+        asset = version["asset"]
+        parents = [link["name"] for link in asset["parent"]["link"]]
+        parents.append(asset["name"])
+
+        versions[version["id"]] = {
+            "parents": parents,
+            "type": asset["type"]["short"],
+            "path": None
+        }
+
+    name = component_name.replace("\"", "\\\"")
+    name = name.replace("{", "{{").replace("}", "}}")
+    components = list(query_in(
+        session,
+        "select name, version_id from Component where name is \"" + name +
+        "\" and version_id in ({0})",
+        versions.keys()
+    ))
+
+    paths = get_files_for_components(session, components, first_frame=False)
+    for component in components:
+        versions[component["version_id"]]["path"] = paths.get(component["id"])
+
+    return versions
+
+
 @async
 def create_job(event):
     user_id = event["source"]["user"]["id"]
@@ -62,69 +114,111 @@ def create_job(event):
 
     job = ftrack.createJob("Collecting Assets", "queued", ftrack_user)
     job.setStatus("running")
+    track_job(job.getId())
+
+    try:
+        collect(event, job)
+    except:
+        job.setStatus("failed")
+        raise
+    finally:
+        release_job(job.getId())
+
+
+def collect(event, job):
+    """Collect the assets of the selected versions reporting to *job*."""
     values = event["data"]["values"]
     errors = ""
+    progress = JobProgress(get_legacy_writer(job), "Collecting Assets")
+    transfer = Transfer(
+        workers=int(values.get("workers") or 4),
+        mode=values.get("mode", "copy"),
+        verify=values.get("verify", "size"),
+        progress=progress
+    )
+    scanner = SequenceScanner()
+
+    # resolving versions in bulk
+    version_ids = [item["entityId"] for item in event["data"]["selection"]]
+    try:
+        session = ftrack_api.Session()
+        versions = prefetch_versions(
+            session, version_ids, values["component_name"]
+        )
+    except:
+        versions = {}
+        errors += traceback.format_exc() + "\n"
 
     # collecting sources and destinations
-    for item in event["data"]["selection"]:
+    parent_number = int(values["parent_number"])
+    for version_id in version_ids:
+        if version_id not in versions:
+            errors += "Version {0} could not be found.\n".format(version_id)
+            continue
+
+        parent_path = ""
         try:
-            entity = ftrack.AssetVersion(item["entityId"])
+            version = versions[version_id]
 
             # adding path to errors
-            parent_path = ""
-            parents = entity.getParents()
-            parents.reverse()
-            for p in parents:
-                parent_path += p.getName() + "/"
+            parents = version["parents"]
+            parent_path = "/".join(parents) + "/"
 
-            parent_number = int(values["parent_number"])
             parent_prefix = ""
-            for p in reversed(list(reversed(parents))[:parent_number]):
-                parent_prefix += p.getName() + "."
-
-            component_name = values["component_name"]
+            for name in reversed(list(reversed(parents))[:parent_number]):
+                parent_prefix += name + "."
 
-            try:
-                component = entity.getComponent(name=component_name)
-            except:
+            src = version["path"]
+            if src is None:
                 continue
 
-            src = get_file_for_component(component)
-
-            # copying sources to destinations
-            if entity.getAsset().getType().getShort() == "img":
-                dir_name = entity.getParent().getParent().getName()
+            # collecting sources to destinations
+            if version["type"] == "img":
+                dir_name = parents[-2]
                 if parent_prefix:
                     dir_name = parent_prefix
 
                 asset_dir = os.path.join(values["collection_directory"], dir_name)
 
-                if os.path.exists(asset_dir):
-                    # delete existing files
-                    shutil.rmtree(asset_dir)
-
-                os.makedirs(asset_dir)
-
-                for f in os.listdir(os.path.dirname(src)):
-                    path = os.path.join(os.path.dirname(src), f)
-
-                    basename = format_basename(src, values["file_formatting"])
+                destinations = set()
+                for path in scanner.get_members(src):
+                    basename = format_basename(path, values["file_formatting"])
 
                     basename = parent_prefix + re.sub(r".%04d", "", basename)
                     dst = os.path.join(asset_dir, basename)
 
-                    shutil.copy(path, dst)
+                    transfer.add(path, dst)
+                    destinations.add(os.path.normcase(dst))
+
+                # delete stale files, identical files are kept and skipped
+                if os.path.exists(asset_dir):
+                    for f in os.listdir(asset_dir):
+                        path = os.path.join(asset_dir, f)
+                        if os.path.normcase(path) in destinations:
+                            continue
+
+                        # symlinks are unlinked, even those to directories
+                        if os.path.isdir(path) and not os.path.islink(path):
+                            shutil.rmtree(path)
+                        else:
+                            os.unlink(path)
             else:
                 basename = format_basename(src, values['file_formatting'])
                 basename = parent_prefix + basename
 
                 dst = os.path.join(values["collection_directory"], basename)
 
-                shutil.copy(src, dst)
+                transfer.add(src, dst)
         except:
             errors += parent_path + "\n"
             errors += traceback.format_exc() + "\n"
 
+    # copying sources to destinations
+    progress.update(total=len(transfer))
+    for src, dst, error in transfer.run():
+        errors += "{0} -> {1}\n".format(src, dst)
+        errors += error + "\n"
+
     # generate error report
     if errors:
         temp_txt = os.path.join(values["collection_directory"], "errors.txt")
@@ -132,6 +226,7 @@ def create_job(event):
         f.write(errors)
         f.close()
 
+    progress.finish(transfer.format())
     job.setStatus("done")
 
 
@@ -200,6 +295,52 @@ def launch(event):
                 "type": "number",
                 "name": "parent_number",
                 "value": 0
+            },
+            {
+                "label": "Collection Mode",
+                "type": "enumerator",
+                "name": "mode",
+                "data": [
+                    {
+                        "label": "Copy",
+                        "value": "copy"
+                    },
+                    {
+                        "label": "Hardlink (same volume)",
+                        "value": "hardlink"
+                    },
+                    {
+                        "label": "Symlink",
+                        "value": "symlink"
+                    },
+                    {
+                        "label": "Reflink (copy-on-write volume)",
+                        "value": "reflink"
+                    }
+                ],
+                "value": "copy"
+            },
+            {
+                "label": "Skip Identical Files By",
+                "type": "enumerator",
+                "name": "verify",
+                "data": [
+                    {
+                        "label": "Size and Modification Time",
+                        "value": "size"
+                    },
+                    {
+                        "label": "Checksum",
+                        "value": "hash"
+                    }
+                ],
+                "value": "size"
+            },
+            {
+                "label": "Parallel Copies",
+                "type": "number",
+                "name": "workers",
+                "value": 4
             }
         ]
     }
@@ -2,9 +2,45 @@ import sys
 import argparse
 import logging
 import os
+import re
+import json
 import getpass
+import threading
+import traceback
 
+import clique
 import ftrack
+import ftrack_api
+from ftrack_hooks.component import create_components
+from ftrack_hooks.job import (
+    JobProgress, get_api_writer, track_job, release_job
+)
+from ftrack_hooks.query import chunks, query_in
+from ftrack_hooks.sequence import scan_sequences
+
+#: Default naming rule matching scanned files to versions.
+NAMING_RULE = r"(?P<asset>.+?)_v(?P<version>\d+)"
+
+
+def async(fn):
+    """Run *fn* asynchronously."""
+    def wrapper(*args, **kwargs):
+        thread = threading.Thread(target=fn, args=args, kwargs=kwargs)
+        thread.start()
+    return wrapper
+
+
+def get_scan_name(path):
+    """Return the name of scanned *path* to match naming rules against.
+
+    The name of a sequence is its head, ie. "shot_v001" for
+    "/renders/shot_v001.%04d.exr", and the name of a file its base name
+    without extension.
+    """
+    if isinstance(path, clique.Collection):
+        return os.path.basename(path.head).rstrip("._")
+
+    return os.path.splitext(os.path.basename(path))[0]
 
 
 class ComponentAdd(ftrack.Action):
@@ -69,6 +105,135 @@ class ComponentAdd(ftrack.Action):
             }]
         }
 
+    def get_scan_components(self, session, version_ids, root, rule,
+                            component_name):
+        """Return the components to create from scanning *root*.
+
+        Scanned sequences and files are matched to *version_ids* by the
+        regular expression *rule*, by the "asset" name and "version" number
+        groups it has. A "component" group names the component, else it is
+        named *component_name*. Returns a list of components for
+        `create_components` and a list of skipped messages.
+        """
+        rule = re.compile(rule, re.IGNORECASE)
+        groups = rule.groupindex
+
+        versions = {}
+        existing = set()
+        for version in query_in(
+            session,
+            "select version, asset.name from AssetVersion where id in ({0})",
+            version_ids
+        ):
+            key = version["version"]
+            if "asset" in groups:
+                key = (version["asset"]["name"].lower(), key)
+            versions[key] = version
+
+        for component in query_in(
+            session,
+            "select name, version_id from Component where version_id in ({0})",
+            version_ids
+        ):
+            existing.add((component["version_id"], component["name"]))
+
+        components = []
+        skipped = []
+        for path in scan_sequences(root):
+            match = rule.search(get_scan_name(path))
+            if not match:
+                continue
+
+            key = int(match.group("version"))
+            if "asset" in groups:
+                key = (match.group("asset").lower(), key)
+
+            version = versions.get(key)
+            if version is None:
+                continue
+
+            name = component_name
+            if "component" in groups:
+                name = match.group("component")
+
+            if (version["id"], name) in existing:
+                skipped.append(
+                    "Component \"{0}\" already exists for {1}.".format(
+                        name, get_scan_name(path)
+                    )
+                )
+                continue
+
+            existing.add((version["id"], name))
+            components.append(
+                {"version": version, "name": name, "path": path}
+            )
+
+        return components, skipped
+
+    @async
+    def scan_job(self, event, chunk_size=20):
+        """Register the components scanned from a directory in a job.
+
+        Components are created *chunk_size* at a time, with a commit per
+        chunk.
+        """
+        values = event["data"]["values"]
+        version_ids = [
+            item["entityId"] for item in event["data"]["selection"]
+        ]
+
+        session = ftrack_api.Session()
+        user = session.query(
+            "User where username is \"{0}\"".format(
+                event["source"]["user"]["username"]
+            )
+        ).one()
+        job = session.create(
+            "Job",
+            {
+                "user": user,
+                "status": "running",
+                "data": json.dumps({"description": "Adding components."})
+            }
+        )
+        session.commit()
+        track_job(job["id"])
+
+        try:
+            progress = JobProgress(
+                get_api_writer(session, job), "Adding components."
+            )
+            skipped = []
+            try:
+                components, skipped = self.get_scan_components(
+                    session, version_ids, values["component_path"],
+                    values["naming_rule"] or NAMING_RULE,
+                    values["component_name"]
+                )
+                for message in skipped:
+                    self.logger.warning(message)
+
+                progress.update(total=len(components))
+                location = session.pick_location()
+                for chunk in chunks(components, chunk_size):
+                    create_components(session, chunk, location)
+                    session.commit()
+                    progress.update(items=len(chunk))
+            except:
+                self.logger.error(traceback.format_exc())
+                session.rollback()
+                job["status"] = "failed"
+            else:
+                job["status"] = "done"
+
+            progress.finish(
+                "{0} skipped.".format(len(skipped)) if skipped else None
+            )
+            session.commit()
+        finally:
+            release_job(job["id"])
+
     def launch(self, event):
         if "values" in event["data"]:
             # Do something with the values or return a new form.
@@ -78,7 +243,7 @@ class ComponentAdd(ftrack.Action):
             selection = data.get("selection", [])
             version = ftrack.AssetVersion(selection[0]["entityId"])
 
-            if not values["component_name"] or not values["component_path"]:
+            if not values["component_path"]:
                 return {
                     "success": False,
                     "message": "Missing input."
@@ -90,6 +255,49 @@ class ComponentAdd(ftrack.Action):
                     "message": "Path doesn't exist."
                 }
 
+            if values.get("mode") == "scan":
+                if not os.path.isdir(values["component_path"]):
+                    return {
+                        "success": False,
+                        "message": "Path is not a directory."
+                    }
+
+                try:
+                    rule = re.compile(values["naming_rule"] or NAMING_RULE)
+                except re.error as error:
+                    return {
+                        "success": False,
+                        "message": "Invalid naming rule: {0}".format(error)
+                    }
+
+                if "version" not in rule.groupindex:
+                    return {
+                        "success": False,
+                        "message": "Naming rule has no version group."
+                    }
+
+                if not (
+                    values["component_name"] or
+                    "component" in rule.groupindex
+                ):
+                    return {
+                        "success": False,
+                        "message": "Missing input."
+                    }
+
+                self.scan_job(event)
+
+                return {
+                    "success": True,
+                    "message": "Adding components. Click Job for details."
+                }
+
+            if not values["component_name"]:
+                return {
+                    "success": False,
+                    "message": "Missing input."
+                }
+
             try:
                 version.createComponent(name=values["component_name"],
                                         path=values["component_path"])
@@ -116,6 +324,22 @@ class ComponentAdd(ftrack.Action):
                     "label": "Component Path",
                     "type": "text",
                     "name": "component_path",
+                },
+                {
+                    "label": "Mode",
+                    "type": "enumerator",
+                    "name": "mode",
+                    "data": [
+                        {"label": "Single path", "value": "single"},
+                        {"label": "Scan directory", "value": "scan"}
+                    ],
+                    "value": "single"
+                },
+                {
+                    "label": "Naming Rule",
+                    "type": "text",
+                    "name": "naming_rule",
+                    "value": NAMING_RULE
                 }
             ]
         }
@@ -10,6 +10,9 @@ import shutil
 import ftrack
 import ftrack_template
 import ftrack_api
+from ftrack_hooks.job import (
+    JobProgress, get_legacy_writer, track_job, release_job
+)
 
 session = ftrack_api.Session()
 
@@ -28,48 +31,60 @@ def create_job(event):
     job = ftrack.createJob("Create Structure", "queued",
                            ftrack.User(id=event["source"]["user"]["id"]))
     job.setStatus("running")
-
+    track_job(job.getId())
     try:
-        for item in event["data"]["selection"]:
-            # Geting any object types
-            entity_id = item["entityId"]
-            entity = session.get("TypedContext", entity_id)
-
-            if not entity:
-                entity_type = item["entityType"].lower()
-
-                if entity_type == "show":
-                    entity = session.get("Project", entity_id)
-                if entity_type == "assetversion":
-                    entity = session.get("AssetVersion", entity_id)
-                if entity_type == "component":
-                    entity = session.get("Component", entity_id)
-
-            templates = ftrack_template.discover_templates()
-            valid_templates = ftrack_template.format(
-                {}, templates, entity, return_mode="all"
-            )
-
-            print "Creating Directories/Files:"
-            for path, template in valid_templates:
-
-                if template.isfile:
-                    if not os.path.exists(os.path.dirname(path)):
-                        print os.path.dirname(path)
-                        os.makedirs(os.path.dirname(path))
-
-                    if not os.path.exists(path):
-                        print path
-                        shutil.copy(template.source, path)
-                else:
-                    if not os.path.exists(path):
-                        print path
-                        os.makedirs(path)
-    except:
-        print traceback.format_exc()
-        job.setStatus("failed")
-    else:
-        job.setStatus("done")
+        progress = JobProgress(
+            get_legacy_writer(job), "Create Structure",
+            total=len(event["data"]["selection"])
+        )
+
+        try:
+            for item in event["data"]["selection"]:
+                # Geting any object types
+                entity_id = item["entityId"]
+                entity = session.get("TypedContext", entity_id)
+
+                if not entity:
+                    entity_type = item["entityType"].lower()
+
+                    if entity_type == "show":
+                        entity = session.get("Project", entity_id)
+                    if entity_type == "assetversion":
+                        entity = session.get("AssetVersion", entity_id)
+                    if entity_type == "component":
+                        entity = session.get("Component", entity_id)
+
+                templates = ftrack_template.discover_templates()
+                valid_templates = ftrack_template.format(
+                    {}, templates, entity, return_mode="all"
+                )
+
+                print "Creating Directories/Files:"
+                for path, template in valid_templates:
+
+                    if template.isfile:
+                        if not os.path.exists(os.path.dirname(path)):
+                            print os.path.dirname(path)
+                            os.makedirs(os.path.dirname(path))
+
+                        if not os.path.exists(path):
+                            print path
+                            shutil.copy(template.source, path)
+                    else:
+                        if not os.path.exists(path):
+                            print path
+                            os.makedirs(path)
+
+                progress.update(items=1)
+        except:
+            print traceback.format_exc()
+            progress.finish()
+            job.setStatus("failed")
+        else:
+            progress.finish()
+            job.setStatus("done")
+    finally:
+        release_job(job.getId())
 
 
 class CreateStructure(ftrack.Action):
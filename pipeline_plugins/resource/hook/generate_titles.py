@@ -5,10 +5,12 @@ import getpass
 import re
 import ntpath
 import traceback
-import uuid
-import subprocess
-import tempfile
 import threading
+from ftrack_hooks.job import (
+    JobProgress, get_legacy_writer, track_job, release_job
+)
+from ftrack_hooks.sequence import SequenceScanner
+from ftrack_hooks.title import get_resolution, render_titles
 
 logging.basicConfig()
 logger = logging.getLogger()
@@ -40,60 +42,31 @@ def async(fn):
     return wrapper
 
 
-def generate_title(image_magick_dir, output_file, input_file, size,
-                   south_west_text, south_east_text, north_west_text):
-
-    CREATE_NO_WINDOW = 0x08000000
-    temp_txt = os.path.join(tempfile.gettempdir(), str(uuid.uuid4()) + '.txt')
-    temp_png = os.path.join(tempfile.gettempdir(), str(uuid.uuid4()) + '.png')
-
-    # get width of file
-    cmd = os.path.join(image_magick_dir, 'identify.exe')
-    cmd += ' -format %wx%h'
-    cmd += ' %s[1] > %s' % (input_file, temp_txt)
-
-    # for some reason getting stdout from subprocess.call/Popen doesn't work
-    f = open(temp_txt, 'w')
-    f.close()
-    os.popen(cmd)
-    f = open(temp_txt, 'r')
-    resolution = f.read()
-    f.close()
-
-    # generate empty title image
-    args = [os.path.join(image_magick_dir, 'convert.exe'), '-size', resolution,
-            'xc:rgba(0,0,0,0)', temp_png]
-
-    subprocess.call(args, creationflags=CREATE_NO_WINDOW)
-
-    args = [os.path.join(image_magick_dir, 'convert.exe'), temp_png,
-            '-fill', 'white', '-undercolor', '#00000080', '-gravity',
-            'SouthWest', '-pointsize', size, '-annotate', '+0+5',
-            ' %s ' % south_west_text,
-            '-fill', 'white', '-undercolor', '#00000080', '-gravity',
-            'SouthEast', '-pointsize', size, '-annotate', '+0+5',
-            ' %s ' % south_east_text,
-            '-fill', 'white', '-undercolor', '#00000080', '-gravity',
-            'NorthWest', '-pointsize', size, '-annotate', '+0+5',
-            ' %s ' % north_west_text,
-            output_file]
-
-    subprocess.call(args, creationflags=CREATE_NO_WINDOW)
-
-    # clean up temp files
-    os.remove(temp_png)
-    os.remove(temp_txt)
-
-
 @async
 def create_job(event):
-    values = event['data']['values']
     job = ftrack.createJob('Generating Titles', 'queued',
                            ftrack.User(id=event['source']['user']['id']))
     job.setStatus('running')
+    track_job(job.getId())
+
+    try:
+        generate(event, job)
+    except:
+        job.setStatus('failed')
+        raise
+    finally:
+        release_job(job.getId())
+
 
-    image_magick_dir = r'K:\development\tools\image-magick'
+def generate(event, job):
+    '''Generate the titles of the selected versions reporting to *job*.'''
+    values = event['data']['values']
     errors = ''
+    progress = JobProgress(get_legacy_writer(job), 'Generating Titles',
+                           total=len(event['data']['selection']))
+    scanner = SequenceScanner()
+    titles = []
+    paths = {}
 
     # Generateting sources and destinations
     for item in event['data']['selection']:
@@ -123,19 +96,30 @@ def create_job(event):
             north_west_text = 'Status: "%s"' % entity.getStatus().getName()
 
             if entity.getAsset().getType().getShort() == 'img':
-                src = os.listdir(os.path.dirname(input_file))[0]
-                input_file = os.path.join(os.path.dirname(input_file), src)
+                input_file = scanner.get_first_member(input_file)
                 output_file = re.sub(r'.%04d', '', output_file)
 
             output_file = os.path.splitext(output_file)[0] + '.png'
             output_file = os.path.join(values['output_directory'], output_file)
 
-            generate_title(image_magick_dir, output_file, input_file, '25',
-                           south_west_text, south_east_text, north_west_text)
+            titles.append((output_file, input_file, 25, south_west_text,
+                           south_east_text, north_west_text,
+                           get_resolution(input_file)))
+            paths[output_file] = path
         except:
             errors += path + '\n'
             errors += traceback.format_exc() + '\n'
 
+            progress.update(items=1)
+
+    # Rendering titles in parallel
+    for arguments, error in render_titles(titles):
+        if error:
+            errors += paths[arguments[0]] + '\n'
+            errors += error + '\n'
+
+        progress.update(items=1)
+
     # generate error report
     if errors:
         temp_txt = os.path.join(values['output_directory'], 'errors.txt')
@@ -143,6 +127,7 @@ def create_job(event):
         f.write(errors)
         f.close()
 
+    progress.finish()
     job.setStatus('done')
 
 
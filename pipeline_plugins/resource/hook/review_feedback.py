@@ -8,6 +8,10 @@ import tempfile
 import uuid
 
 import ftrack
+import ftrack_api
+from ftrack_hooks.job import track_job, release_job
+from ftrack_hooks.query import chunks, query_in
+from ftrack_hooks.report import FORMATS, Report, open_report
 
 
 def async(fn):
@@ -18,6 +22,44 @@ def async(fn):
     return wrapper
 
 
+#: Columns of csv reports.
+FIELDS = ("object", "frame", "type", "invitee", "text")
+
+
+def format_text(record):
+    """Yield the text of the object *record*."""
+    yield record["name"] + ":\n\n\n"
+    for frame in record["frames"]:
+        yield "Frame: %s " % str(frame["frame"]) + "-" * 50 + "\n\n"
+        for note in frame["notes"]:
+            yield note["invitee"] + ":\n"
+            yield note["text"] + "\n"
+
+            for reply in note["replies"]:
+                yield "\n"
+                yield reply["invitee"] + ":\n"
+                yield reply["text"] + "\n"
+
+            yield "\n"
+        yield "\n\n"
+    yield "-" * 50
+
+
+def format_rows(record):
+    """Yield the csv rows of the object *record*, one per note and reply."""
+    notes = [(frame["frame"], note) for frame in record["frames"]
+             for note in frame["notes"]]
+    notes.extend(("", note) for note in record["notes"])
+
+    for frame, note in notes:
+        yield {"object": record["name"], "frame": frame, "type": "note",
+               "invitee": note["invitee"], "text": note["text"]}
+
+        for reply in note["replies"]:
+            yield {"object": record["name"], "frame": frame, "type": "reply",
+                   "invitee": reply["invitee"], "text": reply["text"]}
+
+
 class ReviewFeedback(ftrack.Action):
     """Custom action."""
 
@@ -70,63 +112,123 @@ class ReviewFeedback(ftrack.Action):
             }]
         }
 
-    def generate_feedback(self, event):
-        data = event["data"]
-        selection = data.get("selection", [])
-        session = ftrack.ReviewSession(selection[0]["entityId"])
-
+    def get_notes(self, session, object_ids):
+        """Return the notes of *object_ids* with their replies.
+
+        Returns a dictionary of object id to a list of notes, each with the
+        keys `text`, `meta` and `replies`, where replies have the keys
+        `text` and `meta`. Notes and replies are fetched in bulk.
+        """
+        notes = {}
+        replies = {}
+        for note in query_in(
+            session,
+            "select content, parent_id, in_reply_to_id, metadata.key, "
+            "metadata.value from Note where parent_id in ({0}) "
+            "order by date",
+            object_ids
+        ):
+            if note["in_reply_to_id"]:
+                continue
+
+            data = {
+                "text": note["content"],
+                "meta": dict(note["metadata"]),
+                "replies": []
+            }
+            notes.setdefault(note["parent_id"], []).append(data)
+            replies[note["id"]] = data["replies"]
+
+        for reply in query_in(
+            session,
+            "select content, in_reply_to_id, metadata.key, metadata.value "
+            "from Note where in_reply_to_id in ({0}) order by date",
+            replies.keys()
+        ):
+            replies[reply["in_reply_to_id"]].append({
+                "text": reply["content"],
+                "meta": dict(reply["metadata"])
+            })
+
+        return notes
+
+    def get_records(self, session, review_session_id, chunk_size=100):
+        """Yield a report record per object of *review_session_id*.
+
+        Notes are fetched for *chunk_size* objects at a time, so records are
+        yielded while the session is still being read.
+        """
         invitees = {}
-        for invite in session.getInvitees():
-            invitees[invite.get("id")] = invite.get("name")
-
-        session_objects = {}
-        for obj in session.getObjects():
-            notes = {"frames": [], "non_frame": []}
-            for note in obj.getNotes():
-                meta = note.getMeta()
-                data = {"text": note.get("text"),
-                        "invitee": invitees[meta["inviteeId"]],
-                        "replies": []}
-
-                for reply in note.getNotes():
-                    data["replies"].append(reply)
-
-                if "reviewFrame" in note.getMeta():
-                    frame_number = json.loads(meta["reviewFrame"])["number"]
-                    notes["frames"].append(frame_number)
+        for invite in session.query(
+            "select id, name from ReviewSessionInvitee where "
+            "review_session_id is \"{0}\"".format(review_session_id)
+        ):
+            invitees[invite["id"]] = invite["name"]
+
+        objects = session.query(
+            "select id, name from ReviewSessionObject where "
+            "review_session_id is \"{0}\" order by sort_order".format(
+                review_session_id
+            )
+        ).all()
+
+        for chunk in chunks(objects, chunk_size):
+            object_notes = self.get_notes(
+                session, [obj["id"] for obj in chunk]
+            )
+
+            for obj in chunk:
+                frames = {}
+                notes = []
+                for note in object_notes.get(obj["id"], []):
+                    meta = note["meta"]
+                    replies = []
+                    for reply in note["replies"]:
+                        replies.append({
+                            "invitee": invitees[reply["meta"]["inviteeId"]],
+                            "text": reply["text"]
+                        })
 
-                    if str(frame_number) in notes:
-                        notes[str(frame_number)].append(data)
+                    data = {
+                        "invitee": invitees[meta["inviteeId"]],
+                        "text": note["text"],
+                        "replies": replies
+                    }
+
+                    if "reviewFrame" in meta:
+                        frame_number = json.loads(
+                            meta["reviewFrame"]
+                        )["number"]
+                        frames.setdefault(frame_number, []).append(data)
                     else:
-                        notes[str(frame_number)] = [data]
-                else:
-                    notes["non_frame"].append(data)
-
-            session_objects[obj.get("name")] = notes
-
-        text = ""
-        for obj in session_objects:
-            text += obj + ":\n\n\n"
-            frames = list(set(session_objects[obj]["frames"]))
-            frames.sort()
-            for frame in frames:
-                text += "Frame: %s " % str(frame) + "-" * 50 + "\n\n"
-                for note in session_objects[obj][str(frame)]:
-                    text += note["invitee"] + ":\n"
-                    text += note["text"] + "\n"
+                        notes.append(data)
 
-                    for reply in note["replies"]:
-                        text += "\n"
-                        text += invitees[reply.getMeta()["inviteeId"]] + ":\n"
-                        text += reply.get("text") + "\n"
+                yield {
+                    "name": obj["name"],
+                    "frames": [
+                        {"frame": frame, "notes": frames[frame]}
+                        for frame in sorted(frames)
+                    ],
+                    "notes": notes
+                }
 
-                    text += "\n"
-                text += "\n\n"
-            text += "-" * 50
+    def generate_feedback(self, event):
+        data = event["data"]
+        selection = data.get("selection", [])
+        values = data.get("values", {})
+        report_format = values.get("format", "text")
+        session = ftrack_api.Session()
 
-        f = os.path.join(tempfile.gettempdir(), str(uuid.uuid4()) + ".txt")
-        with open(f, "w") as temp_file:
-            temp_file.write(text)
+        f = os.path.join(
+            tempfile.gettempdir(), str(uuid.uuid4()) + FORMATS[report_format]
+        )
+        with open_report(f, report_format) as temp_file:
+            with Report(temp_file, report_format, text=format_text,
+                        rows=format_rows, fields=FIELDS) as report:
+                for record in self.get_records(
+                    session, selection[0]["entityId"]
+                ):
+                    report.write(record)
 
         return f
 
@@ -135,6 +237,7 @@ class ReviewFeedback(ftrack.Action):
         job = ftrack.createJob("Generating Feedback", "queued",
                                ftrack.User(id=event["source"]["user"]["id"]))
         job.setStatus("running")
+        track_job(job.getId())
 
         try:
             f = self.generate_feedback(event)
@@ -145,9 +248,28 @@ class ReviewFeedback(ftrack.Action):
             job.setStatus("failed")
         else:
             job.setStatus("done")
+        finally:
+            release_job(job.getId())
 
     def launch(self, event):
 
+        if "values" not in event["data"]:
+            return {
+                "items": [
+                    {
+                        "label": "Format",
+                        "type": "enumerator",
+                        "name": "format",
+                        "data": [
+                            {"label": "Text", "value": "text"},
+                            {"label": "CSV", "value": "csv"},
+                            {"label": "JSON", "value": "json"}
+                        ],
+                        "value": "text"
+                    }
+                ]
+            }
+
         self.create_job(event)
 
         return {
@@ -4,6 +4,39 @@ import logging
 import getpass
 
 import ftrack
+import ftrack_api
+
+
+def _get_version(obj):
+    return obj["asset_version"]["version"] if obj["asset_version"] else 0
+
+
+def _get_shot(obj):
+    if not obj["asset_version"]:
+        return ""
+    return obj["asset_version"]["asset"]["parent"]["name"]
+
+
+def _get_status(obj):
+    if not obj["asset_version"] or not obj["asset_version"]["status"]:
+        return ""
+    return obj["asset_version"]["status"]["name"]
+
+
+#: Keys review session objects can be sorted by.
+SORT_KEYS = {
+    "name": lambda obj: obj["name"],
+    "shot": _get_shot,
+    "version": _get_version,
+    "status": _get_status
+}
+
+SORT_LABELS = [
+    ("name", "Name"),
+    ("shot", "Shot"),
+    ("version", "Version"),
+    ("status", "Status")
+]
 
 
 class ReviewSort(ftrack.Action):
@@ -56,28 +89,87 @@ class ReviewSort(ftrack.Action):
             }]
         }
 
+    def sort(self, session, review_session_id, keys):
+        """Sort the objects of *review_session_id* by *keys*.
+
+        Objects are sorted stably by the `SORT_KEYS` named in *keys*, ties
+        keeping their current order. Only objects whose order changed are
+        written, in a single commit. Returns the amount of objects moved.
+        """
+        objects = session.query(
+            "select name, sort_order, asset_version.version, "
+            "asset_version.asset.parent.name, asset_version.status.name "
+            "from ReviewSessionObject where review_session_id is \"{0}\" "
+            "order by sort_order".format(review_session_id)
+        ).all()
+        if not objects:
+            return 0
+
+        sort_start = min(obj["sort_order"] for obj in objects)
+        getters = [SORT_KEYS[key] for key in keys]
+        objects.sort(key=lambda obj: [getter(obj) for getter in getters])
+
+        changed = 0
+        for order, obj in enumerate(objects, sort_start):
+            if obj["sort_order"] != order:
+                obj["sort_order"] = order
+                changed += 1
+
+        if changed:
+            try:
+                session.commit()
+            except Exception:
+                session.rollback()
+                raise
+
+        return changed
+
     def launch(self, event):
 
         data = event["data"]
-        selection = data.get("selection", [])
-        session = ftrack.ReviewSession(selection[0]["entityId"])
-        objs = session.getObjects()
 
-        sort_start = objs[0].get("sort_order")
-        names = {}
-        for obj in objs:
-            names[obj.get("name")] = obj
-            if sort_start > obj.get("sort_order"):
-                sort_start = obj.get("sort_order")
+        if "values" not in data:
+            options = [{"label": label, "value": key}
+                       for key, label in SORT_LABELS]
+            return {
+                "items": [
+                    {
+                        "label": "Sort by",
+                        "type": "enumerator",
+                        "name": "sort_by",
+                        "data": options,
+                        "value": "name"
+                    },
+                    {
+                        "label": "Then by",
+                        "type": "enumerator",
+                        "name": "then_by",
+                        "data": [{"label": "Nothing", "value": ""}] + options,
+                        "value": ""
+                    }
+                ]
+            }
+
+        values = data["values"]
+        keys = [values["sort_by"]]
+        if values.get("then_by"):
+            keys.append(values["then_by"])
 
-        names_sorted = sorted(names)
-        for key in names_sorted:
-            order = sort_start + names_sorted.index(key)
-            names[key].set("sort_order", order)
+        selection = data.get("selection", [])
+        try:
+            changed = self.sort(
+                ftrack_api.Session(), selection[0]["entityId"], keys
+            )
+        except Exception:
+            self.logger.exception("Failed to sort review session.")
+            return {
+                "success": False,
+                "message": "Sorting review failed."
+            }
 
         return {
             "success": True,
-            "message": "Review sorted!"
+            "message": "Review sorted! {0} clips moved.".format(changed)
         }
 
 
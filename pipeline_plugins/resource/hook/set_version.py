@@ -1,9 +1,18 @@
+import re
 import sys
 import argparse
 import logging
 import getpass
+import collections
 
 import ftrack
+import ftrack_api
+import ftrack_api.exception
+from ftrack_hooks.hook_utils import get_files_for_components
+from ftrack_hooks.query import query_in
+
+#: Version token of file names, ie. "_v012".
+VERSION_EXPRESSION = re.compile(r'[/_.]v(\d+)', re.IGNORECASE)
 
 
 class SetVersion(ftrack.Action):
@@ -37,7 +46,7 @@ class SetVersion(ftrack.Action):
         )
 
     def discover(self, event):
-        '''Return action config if triggered on a single selection.'''
+        '''Return action config if triggered on asset versions.'''
         data = event['data']
 
         selection = data.get('selection', [])
@@ -45,9 +54,9 @@ class SetVersion(ftrack.Action):
         if not selection:
             return
 
-        entityType = selection[0]['entityType']
-        if len(selection) != 1 or entityType != 'assetversion':
-            return
+        for item in selection:
+            if item['entityType'] != 'assetversion':
+                return
 
         return {
             'items': [{
@@ -56,6 +65,113 @@ class SetVersion(ftrack.Action):
             }]
         }
 
+    def get_source_numbers(self, session, versions):
+        '''Return the version numbers in the component paths of *versions*.
+
+        Returns a dictionary of version id to the number of the last
+        version token, ie. "_v012", found in the path of its components. The
+        main component of the asset type is tried first, then the others by
+        name.
+
+        '''
+        components = list(query_in(
+            session,
+            'select name, version_id, version.asset.type.component from '
+            'Component where version_id in ({0})',
+            [version['id'] for version in versions]
+        ))
+        paths = get_files_for_components(session, components)
+
+        def order(component):
+            main = component['version']['asset']['type']['component']
+            return component['name'] != main, component['name']
+
+        numbers = {}
+        for component in sorted(components, key=order):
+            if component['version_id'] in numbers:
+                continue
+
+            matches = VERSION_EXPRESSION.findall(
+                paths.get(component['id']) or ''
+            )
+            if matches:
+                numbers[component['version_id']] = int(matches[-1])
+
+        return numbers
+
+    def renumber(self, session, version_ids, rule, number):
+        '''Renumber *version_ids* by *rule* and return the amount changed.
+
+        *rule* is "absolute" to set all versions to *number*, "offset" to
+        add *number* to them or "match_source" to use the version token of
+        their component paths. Collisions with other versions of the same
+        assets are checked with a single query and raise a ValueError
+        before anything is written. Changes are written in a single commit.
+
+        '''
+        versions = list(query_in(
+            session,
+            'select version, asset_id from AssetVersion where id in ({0})',
+            version_ids
+        ))
+
+        if rule == 'match_source':
+            sources = self.get_source_numbers(session, versions)
+
+        targets = {}
+        for version in versions:
+            if rule == 'absolute':
+                target = number
+            elif rule == 'offset':
+                target = version['version'] + number
+            else:
+                target = sources.get(version['id'], version['version'])
+
+            if target <= 0:
+                raise ValueError('Negative or zero is not valid.')
+
+            targets[version['id']] = target
+
+        # Numbers taken by the versions that are not renumbered.
+        taken = collections.defaultdict(set)
+        for version in query_in(
+            session,
+            'select version, asset_id from AssetVersion where asset_id in '
+            '({0})',
+            set(version['asset_id'] for version in versions)
+        ):
+            if version['id'] not in targets:
+                taken[version['asset_id']].add(version['version'])
+
+        collisions = []
+        for version in versions:
+            target = targets[version['id']]
+            if target in taken[version['asset_id']]:
+                collisions.append(target)
+            taken[version['asset_id']].add(target)
+
+        if collisions:
+            raise ValueError(
+                'Version numbers already taken: {0}.'.format(
+                    ', '.join('v{0:03d}'.format(n) for n in collisions)
+                )
+            )
+
+        changed = 0
+        for version in versions:
+            if version['version'] != targets[version['id']]:
+                version['version'] = targets[version['id']]
+                changed += 1
+
+        if changed:
+            try:
+                session.commit()
+            except Exception:
+                session.rollback()
+                raise
+
+        return changed
+
     def launch(self, event):
         if 'values' in event['data']:
             # Do something with the values or return a new form.
@@ -63,28 +179,56 @@ class SetVersion(ftrack.Action):
 
             data = event['data']
             selection = data.get('selection', [])
-            version = ftrack.AssetVersion(selection[0]['entityId'])
+            rule = values.get('rule', 'absolute')
 
-            success = True
-            msg = 'Increased version number.'
+            # Zero is a number, only an empty field is missing.
+            number = values.get('version_number')
+            if number in (None, ''):
+                if rule != 'match_source':
+                    return {
+                        'success': False,
+                        'message': 'No number was submitted.'
+                    }
+                number = 0
 
-            if not values['version_number']:
-                success = False
-                msg = 'No number was submitted.'
-            else:
-                if int(values['version_number']) <= 0:
-                    success = False
-                    msg = 'Negative or zero is not valid.'
-                else:
-                    version.set('version', int(values['version_number']))
+            try:
+                changed = self.renumber(
+                    ftrack_api.Session(),
+                    [item['entityId'] for item in selection],
+                    rule,
+                    int(number)
+                )
+            except ValueError as error:
+                return {
+                    'success': False,
+                    'message': str(error)
+                }
+            except ftrack_api.exception.ServerError as error:
+                self.logger.exception('Renumbering versions failed.')
+                return {
+                    'success': False,
+                    'message': 'Renumbering failed: {0}'.format(error)
+                }
 
             return {
-                'success': success,
-                'message': msg
+                'success': True,
+                'message': 'Renumbered {0} versions.'.format(changed)
             }
 
         return {
             'items': [
+                {
+                    'label': 'Rule',
+                    'type': 'enumerator',
+                    'name': 'rule',
+                    'data': [
+                        {'label': 'Set to number', 'value': 'absolute'},
+                        {'label': 'Offset by number', 'value': 'offset'},
+                        {'label': 'Match source files',
+                         'value': 'match_source'}
+                    ],
+                    'value': 'absolute'
+                },
                 {
                     'label': 'Version number',
                     'type': 'number',
@@ -1,8 +1,25 @@
+import json
 import logging
 import getpass
+import threading
 import traceback
 
 import ftrack
+import ftrack_api
+from ftrack_hooks.job import (
+    JobProgress, get_api_writer, track_job, release_job
+)
+from ftrack_hooks.publish import (
+    VersionPublisher, attach_results, format_results
+)
+
+
+def async(fn):
+    """Run *fn* asynchronously."""
+    def wrapper(*args, **kwargs):
+        thread = threading.Thread(target=fn, args=args, kwargs=kwargs)
+        thread.start()
+    return wrapper
 
 
 class VersionAdd(ftrack.Action):
@@ -66,40 +83,80 @@ class VersionAdd(ftrack.Action):
             }]
         }
 
-    def launch(self, event):
-        if "values" in event["data"]:
-            success = True
-            msg = ""
+    @async
+    def create_job(self, event):
+        """Create the versions of all selected tasks in a job."""
+        values = event["data"]["values"]
+        selection = event["data"]["selection"]
+
+        session = ftrack_api.Session()
+        user = session.query(
+            "User where username is \"{0}\"".format(
+                event["source"]["user"]["username"]
+            )
+        ).one()
+        job = session.create(
+            "Job",
+            {
+                "user": user,
+                "status": "running",
+                "data": json.dumps({"description": "Adding versions."})
+            }
+        )
+        session.commit()
+        track_job(job["id"])
+
+        try:
+            progress = JobProgress(
+                get_api_writer(session, job), "Adding versions.",
+                total=len(selection)
+            )
 
             try:
-                for item in event["data"]["selection"]:
-                    values = event["data"]["values"]
-                    task = ftrack.Task(item["entityId"])
-                    parent = task.getParent()
-                    version_name = values["version_name"]
-                    version_type = values["version_type"]
-
-                    asset = parent.createAsset(name=version_name,
-                                               assetType=version_type)
-                    version = asset.createVersion(taskid=task.getId())
-                    version.publish()
-                    version.set("version", value=int(values["version_number"]))
-
-                    msg = "Version %s " % values["version_name"]
-                    msg += "v%s created." % values["version_number"].zfill(3)
-            except Exception as e:
+                requests = []
+                for item in selection:
+                    requests.append({
+                        "task_id": item["entityId"],
+                        "name": values["version_name"],
+                        "short": values["version_type"],
+                        "number": int(values["version_number"])
+                    })
+
+                publisher = VersionPublisher(session, progress=progress)
+                results = publisher.publish(requests)
+
+                progress.finish(format_results(results))
+                attach_results(session, job, results)
+            except Exception:
                 self.logger.error(traceback.format_exc())
-                success = False
-                msg = str(e)
+                session.rollback()
+                job["status"] = "failed"
+            else:
+                job["status"] = "done"
+
+            session.commit()
+        finally:
+            release_job(job["id"])
+
+    def launch(self, event):
+        if "values" in event["data"]:
+            values = event["data"]["values"]
+
+            self.create_job(event)
 
+            msg = "Creating version %s " % values["version_name"]
+            msg += "v%s. Click Job for details." % (
+                str(values["version_number"]).zfill(3)
+            )
             return {
-                "success": success,
+                "success": True,
                 "message": msg
             }
 
+        session = ftrack_api.Session()
         asset_types = []
-        for at in ftrack.getAssetTypes():
-            asset_types.append({"label": at.getName(), "value": at.getShort()})
+        for at in session.query("select name, short from AssetType"):
+            asset_types.append({"label": at["name"], "value": at["short"]})
 
         return {
             "items": [
@@ -1,16 +1,302 @@
 import sys
+import time
+import collections
 import argparse
 import logging
 import os
 import getpass
 import tempfile
+import threading
 import traceback
 
 import ftrack
+import ftrack_api
+from ftrack_hooks.dispatcher import get_dispatcher
+from ftrack_hooks.query import query_in
+from ftrack_hooks.report import FORMATS, Report, open_report
 
 tools_path = os.getenv("NETWORK_TOOLS_PATH", os.path.dirname(__file__))
 
 
+class ReviewUsageIndex(object):
+    """Per project index of versions to the review sessions using them.
+
+    Only review sessions of the project count. Versions are looked up in
+    bulk the first time they are asked for, and kept up to date from review
+    session and review session object events afterwards. Projects are
+    dropped after `ttl` seconds in case events were missed.
+    """
+
+    def __init__(self, ttl=3600):
+        self.ttl = ttl
+        self._projects = {}
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def get_usage(self, session, project_id, version_ids):
+        """Return the usage of *version_ids* in review sessions.
+
+        Returns the amount of review session objects of *version_ids* and
+        the names of their review sessions, once per object.
+        """
+        with self._lock:
+            project = self._projects.get(project_id)
+            if project is None or time.time() - project["created"] > self.ttl:
+                project = {"created": time.time(), "versions": {}}
+                self._projects[project_id] = project
+
+            missing = [
+                version_id for version_id in version_ids
+                if version_id not in project["versions"]
+            ]
+
+        if missing:
+            versions = dict((version_id, {}) for version_id in missing)
+            names = {}
+            for obj in query_in(
+                session,
+                "select version_id, review_session_id, review_session.name "
+                "from ReviewSessionObject where review_session.project_id is "
+                "\"{0}\" and version_id in ({{0}})".format(project_id),
+                missing
+            ):
+                versions[obj["version_id"]][obj["id"]] = (
+                    obj["review_session_id"]
+                )
+                names[obj["review_session_id"]] = obj["review_session"]["name"]
+
+            with self._lock:
+                project["versions"].update(versions)
+                self._sessions.update(names)
+
+        count = 0
+        names = []
+        with self._lock:
+            for version_id in version_ids:
+                objects = project["versions"].get(version_id, {})
+                for session_id in objects.values():
+                    count += 1
+                    names.append(self._sessions.get(session_id))
+
+        return count, names
+
+    def add_object(self, object_id, version_id, session_id, name,
+                   project_id):
+        """Add or move the review session object *object_id*.
+
+        *session_id* is the review session of the object, named *name* in
+        the project *project_id*.
+        """
+        with self._lock:
+            self._sessions[session_id] = name
+
+            # Remove the object from the version it was moved from.
+            for project in self._projects.values():
+                for objects in project["versions"].values():
+                    objects.pop(object_id, None)
+
+            project = self._projects.get(project_id)
+            if project is None:
+                return
+
+            objects = project["versions"].get(version_id)
+            if objects is not None:
+                objects[object_id] = session_id
+
+    def remove_object(self, object_id):
+        """Remove the review session object *object_id*."""
+        with self._lock:
+            for project in self._projects.values():
+                for objects in project["versions"].values():
+                    objects.pop(object_id, None)
+
+    def rename_session(self, session_id, name):
+        """Rename the review session *session_id*."""
+        with self._lock:
+            if session_id in self._sessions:
+                self._sessions[session_id] = name
+
+    def remove_session(self, session_id):
+        """Remove the review session *session_id* and its objects."""
+        with self._lock:
+            self._sessions.pop(session_id, None)
+            for project in self._projects.values():
+                for objects in project["versions"].values():
+                    for object_id, object_session_id in list(objects.items()):
+                        if object_session_id == session_id:
+                            del objects[object_id]
+
+
+INDEX = ReviewUsageIndex()
+
+
+def update_objects(session, updates):
+    """Add or move review session objects in the index."""
+    for update in updates:
+        obj = update["entity"]
+        INDEX.add_object(
+            obj["id"], obj["version_id"], obj["review_session_id"],
+            obj["review_session"]["name"], obj["review_session"]["project_id"]
+        )
+
+
+def remove_objects(session, updates):
+    """Remove review session objects from the index."""
+    for update in updates:
+        INDEX.remove_object(update["entity_id"])
+
+
+def update_sessions(session, updates):
+    """Rename review sessions in the index."""
+    for update in updates:
+        INDEX.rename_session(update["entity_id"], update["entity"]["name"])
+
+
+def remove_sessions(session, updates):
+    """Remove review sessions from the index."""
+    for update in updates:
+        INDEX.remove_session(update["entity_id"])
+
+
+_index_subscribed = False
+_index_lock = threading.Lock()
+
+
+def get_session():
+    """Return a new session for a launch, subscribing the index on first use.
+
+    Each launch queries through its own session, which is closed with the
+    launch, so cached entities neither pile up nor go stale between
+    launches. It does not connect to the event hub, as it only queries.
+    The index is kept up to date through a separate session, as its events
+    are handled on the thread of its event hub while launches run on the
+    thread of the legacy event hub. It is not created before the action is
+    first used.
+    """
+    global _index_subscribed
+
+    with _index_lock:
+        if not _index_subscribed:
+            subscribe_index()
+            _index_subscribed = True
+
+    return ftrack_api.Session(auto_connect_event_hub=False)
+
+
+def subscribe_index():
+    """Keep the review usage index up to date from events."""
+    session = ftrack_api.Session(auto_connect_event_hub=True)
+    dispatcher = get_dispatcher(session)
+
+    dispatcher.register(
+        update_objects,
+        entity_type="reviewsessionobject",
+        keys=None,
+        actions=("add", "update"),
+        resolve="ReviewSessionObject",
+        projections=[
+            "version_id", "review_session_id", "review_session.name",
+            "review_session.project_id"
+        ]
+    )
+    dispatcher.register(
+        remove_objects,
+        entity_type="reviewsessionobject",
+        keys=None,
+        actions=("remove",),
+        resolve=None
+    )
+    dispatcher.register(
+        update_sessions,
+        entity_type="reviewsession",
+        keys=("name",),
+        resolve="ReviewSession",
+        projections=["name"]
+    )
+    dispatcher.register(
+        remove_sessions,
+        entity_type="reviewsession",
+        keys=None,
+        actions=("remove",),
+        resolve=None
+    )
+
+    # Events of the ftrack_api session are handled while waiting.
+    thread = threading.Thread(target=session.event_hub.wait)
+    thread.daemon = True
+    thread.start()
+
+
+def group_notes(versions, notes, categories):
+    """Return the *notes* of *versions* grouped by note category.
+
+    Notes are grouped in a single pass. Returns a list with a dictionary per
+    category, with the `category` name, the `notes_amount`, the
+    `versions_amount` of versions with notes and the `notes`, each with the
+    `version` string and `text`. Notes are ordered by version.
+    """
+    groups = collections.OrderedDict()
+    groups[None] = {"category": "Uncategorized", "notes": []}
+    for category in categories:
+        groups[category["id"]] = {"category": category["name"], "notes": []}
+
+    # Bucket notes per version, then walk versions in order.
+    version_notes = collections.defaultdict(list)
+    for note in notes:
+        version_notes[note["parent_id"]].append(note)
+
+    for version in versions:
+        for note in version_notes.get(version["id"], []):
+            group = groups.get(note["category_id"], groups[None])
+            group["notes"].append({
+                "version": "v" + str(version["version"]).zfill(3),
+                "text": note["content"]
+            })
+
+    result = []
+    for group in groups.values():
+        group["notes_amount"] = len(group["notes"])
+        group["versions_amount"] = len(
+            set(note["version"] for note in group["notes"])
+        )
+        result.append(group)
+
+    return result
+
+
+#: Columns of csv reports.
+FIELDS = ("asset", "category", "version", "text")
+
+
+def format_text(record):
+    """Yield the text of the summary or category *record*."""
+    if record["type"] == "summary":
+        yield record["asset"] + ":\n"
+        yield "\tReview Session Usage:\t{0}\n".format(
+            record["review_session_usage"]
+        )
+        yield "\tReview Sessions:\t{0}\n".format(record["review_sessions"])
+        yield "\tNotes:\n"
+        return
+
+    yield "\t\t" + record["category"] + ":\n"
+    yield "\t\t\tNotes Amount:{0}\n".format(record["notes_amount"])
+    yield "\t\t\tVersions Amount:{0}\n".format(record["versions_amount"])
+    for note in record["notes"]:
+        yield "\t\t\t{0}:\n".format(note["version"])
+        yield "\t\t\t\t{0}\n".format(note["text"].replace("\n", " "))
+
+
+def format_rows(record):
+    """Yield the csv rows of *record*, one per note of a category."""
+    if record["type"] != "category":
+        return
+
+    for note in record["notes"]:
+        yield {"asset": record["asset"], "category": record["category"],
+               "version": note["version"], "text": note["text"]}
+
+
 class Action(ftrack.Action):
 
     identifier = "version_breakdown"
@@ -58,70 +344,75 @@ class Action(ftrack.Action):
 
     def launch(self, event):
 
+        if "values" not in event["data"]:
+            return {
+                "items": [
+                    {
+                        "label": "Format",
+                        "type": "enumerator",
+                        "name": "format",
+                        "data": [
+                            {"label": "Text", "value": "text"},
+                            {"label": "CSV", "value": "csv"},
+                            {"label": "JSON", "value": "json"}
+                        ],
+                        "value": "text"
+                    }
+                ]
+            }
+
         msg = "Breakdown successfull. Click Job for details."
         ftrack.EVENT_HUB.publishReply(event, data={"success": True,
                                                    "message": msg})
 
         selection = event["data"]["selection"]
+        report_format = event["data"]["values"].get("format", "text")
         temp_dir = tempfile.gettempdir()
-        file_path = os.path.join(temp_dir, "ftrack_version_breakdown.txt")
-        with open(file_path, "w") as f:
-            output = ""
-            v = ftrack.AssetVersion(selection[0]["entityId"])
-            versions = v.getAsset().getVersions()
-            ids = []
-
-            data = {"None": {"name": "Uncategorized", "notes": [],
-                    "versions": []}}
-            for cate in ftrack.getNoteCategories():
-                data[cate.get("entityId")] = {"name": cate.get("name"),
-                                              "notes": [], "versions": []}
-
-            for v in versions:
-                ids.append(v.getId())
-                for note in v.getNotes():
-                    if note.get("categoryid"):
-                        data[note.get("categoryid")]["notes"].append(note)
-                        data[note.get("categoryid")]["versions"].append(v)
-                    else:
-                        data["None"]["versions"].append(v)
-                        data["None"]["notes"].append(note)
-
-            output += "/".join([v.getParent().getParent().getName(),
-                                v.getParent().getName()])
-            output += ":\n"
-            count = 0
-            sessions = []
-            project_id = v.getParents()[-1].getId()
-            for session in ftrack.getReviewSessions(project_id):
-                for obj in session.getObjects():
-                    if obj.get("version_id") in ids:
-                        count += 1
-                        sessions.append(session.get("name"))
-
-            output += "\tReview Session Usage:\t{0}\n".format(count)
-            output += "\tReview Sessions:\t{0}\n".format(list(set(sessions)))
-
-            output += "\tNotes:\n"
-
-            for entry in data:
-                output += "\t\t" + data[entry]["name"] + ":\n"
-                amount = len(data[entry]["notes"])
-                output += "\t\t\tNotes Amount:{0}\n".format(amount)
-                output += "\t\t\tVersions "
-                amount = len(set(data[entry]["versions"]))
-                output += "Amount:{0}\n".format(amount)
-
-                for note in data[entry]["notes"]:
-                    index = data[entry]["notes"].index(note)
-                    version_string = data[entry]["versions"][index]
-                    version_string = version_string.getVersion()
-                    version_string = "v" + str(version_string).zfill(3)
-                    output += "\t\t\t{0}:\n".format(version_string)
-                    text = note.getText().replace("\n", " ")
-                    output += "\t\t\t\t{0}\n".format(text)
-
-            f.write(output)
+        file_path = os.path.join(
+            temp_dir, "ftrack_version_breakdown" + FORMATS[report_format]
+        )
+        with open_report(file_path, report_format) as f, \
+                get_session() as session:
+            report = Report(f, report_format, text=format_text,
+                            rows=format_rows, fields=FIELDS)
+
+            version = session.query(
+                "select asset_id, asset.name, asset.parent.name, link from "
+                "AssetVersion where id is \"{0}\"".format(
+                    selection[0]["entityId"]
+                )
+            ).one()
+            versions = session.query(
+                "select id, version from AssetVersion where asset_id is "
+                "\"{0}\" order by version".format(version["asset_id"])
+            ).all()
+            ids = [v["id"] for v in versions]
+
+            categories = session.query(
+                "select id, name from NoteCategory order by name"
+            ).all()
+            notes = query_in(
+                session,
+                "select parent_id, category_id, content from Note where "
+                "parent_id in ({0}) and in_reply_to_id is None order by date",
+                ids
+            )
+
+            asset = "/".join([version["asset"]["parent"]["name"],
+                              version["asset"]["name"]])
+            project_id = version["link"][0]["id"]
+            count, sessions = INDEX.get_usage(session, project_id, ids)
+
+            report.write({"type": "summary", "asset": asset,
+                          "review_session_usage": count,
+                          "review_sessions": list(set(sessions))})
+
+            for category in group_notes(versions, notes, categories):
+                category["type"] = "category"
+                category["asset"] = asset
+                report.write(category)
+
+            report.close()
 
         user = ftrack.User(id=event["source"]["user"]["id"])
         job = ftrack.createJob("Breakdown", "done", user)
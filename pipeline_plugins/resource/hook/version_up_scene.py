@@ -1,7 +1,19 @@
+import json
 import getpass
+import logging
 import threading
+import traceback
 
 import ftrack
+import ftrack_api
+from ftrack_hooks.job import (
+    JobProgress, get_api_writer, track_job, release_job
+)
+from ftrack_hooks.publish import (
+    VersionPublisher, attach_results, format_results
+)
+
+logger = logging.getLogger(__name__)
 
 
 def async(fn):
@@ -15,28 +27,51 @@ def async(fn):
 @async
 def create_job(event):
 
-    job = ftrack.createJob("Version Up Tasks", "queued",
-                           ftrack.User(id=event["source"]["user"]["id"]))
-    job.setStatus("running")
+    session = ftrack_api.Session()
+    user = session.query(
+        "User where username is \"{0}\"".format(
+            event["source"]["user"]["username"]
+        )
+    ).one()
+    job = session.create(
+        "Job",
+        {
+            "user": user,
+            "status": "running",
+            "data": json.dumps({"description": "Version Up Tasks"})
+        }
+    )
+    session.commit()
+    track_job(job["id"])
 
     try:
-        for item in event["data"]["selection"]:
-            task = ftrack.Task(item["entityId"])
-
-            asset = task.getParent().createAsset(
-                task.getName(),
-                "scene",
-                task=task
-            )
-
-            asset.createVersion(taskid=task.getId())
-
-            asset.publish()
+        selection = event["data"]["selection"]
+        progress = JobProgress(
+            get_api_writer(session, job), "Version Up Tasks",
+            total=len(selection)
+        )
 
-    except:
-        job.setStatus("failed")
-    else:
-        job.setStatus("done")
+        try:
+            requests = [
+                {"task_id": item["entityId"], "short": "scene"}
+                for item in selection
+            ]
+
+            publisher = VersionPublisher(session, progress=progress)
+            results = publisher.publish(requests)
+
+            progress.finish(format_results(results))
+            attach_results(session, job, results)
+        except:
+            logger.error(traceback.format_exc())
+            session.rollback()
+            job["status"] = "failed"
+        else:
+            job["status"] = "done"
+
+        session.commit()
+    finally:
+        release_job(job["id"])
 
 
 def launch(event):
@@ -1,9 +1,12 @@
-import os
 import threading
 import json
 
 import ftrack_api
 import clique
+from ftrack_hooks.component import (
+    create_components, create_members, get_file_type, get_sizes
+)
+from ftrack_hooks.job import track_job, release_job
 
 
 def async(fn):
@@ -51,7 +54,7 @@ def create_component(session, event, component_name, assetversion, component):
         "version": assetversion
     }
 
-    component_path = ""
+    collection = None
     try:
         collection = clique.parse(
             component_location.get_resource_identifier(component),
@@ -61,9 +64,13 @@ def create_component(session, event, component_name, assetversion, component):
         # Assume its a single file
         component_path = component_location.get_resource_identifier(component)
     else:
+        # Resolve the paths of all members in one call.
         members = list(component.get("members", []))
-        for member in members:
-            collection.add(component_location.get_resource_identifier(member))
+        if members:
+            for member_path in component_location.get_resource_identifiers(
+                members
+            ):
+                collection.add(member_path)
 
         component_path = collection.format()
 
@@ -82,12 +89,13 @@ def create_component(session, event, component_name, assetversion, component):
         # Removing existing members from location
         components = list(component_entity.get("members", []))
         components += [component_entity]
+        existing = []
         for component in components:
             for loc in component["component_locations"]:
                 if location["id"] == loc["location_id"]:
-                    location.remove_component(
-                        component, recursive=False
-                    )
+                    existing.append(component)
+        if existing:
+            location.remove_components(existing, recursive=False)
 
         # Deleting existing members on component entity
         for member in component_entity.get("members", []):
@@ -101,39 +109,26 @@ def create_component(session, event, component_name, assetversion, component):
             component_entity["members"] = []
 
         # Add components to origin location
-        try:
-            collection = clique.parse(component_path)
-        except ValueError:
-            # Assume its a single file
+        if collection is None:
             origin_location.add_component(
                 component_entity, component_path
             )
         else:
-            # Create member components for sequence.
-            for member_path in collection:
-
-                size = 0
-                try:
-                    size = os.path.getsize(member_path)
-                except OSError:
-                    pass
-
-                name = collection.match(member_path).group("index")
-
-                member_data = {
-                    "name": name,
-                    "container": component_entity,
-                    "size": size,
-                    "file_type": os.path.splitext(member_path)[-1]
-                }
-
-                component = session.create(
-                    "FileComponent", member_data
+            # Create member components for sequence in one pass, and add
+            # them to the origin location in one call.
+            members = create_members(
+                session, component_entity, collection,
+                get_sizes(list(collection)),
+                get_file_type(
+                    session, collection.format("{head}{padding}{tail}")
                 )
-                origin_location.add_component(
-                    component, member_path, recursive=False
+            )
+            if members:
+                origin_location.add_components(
+                    [member for member, member_path in members],
+                    [member_path for member, member_path in members],
+                    recursive=False
                 )
-                component_entity["members"].append(component)
 
         # Add components to location.
         location.add_component(
@@ -142,10 +137,14 @@ def create_component(session, event, component_name, assetversion, component):
 
     # Create new component if none exists.
     if not component_entity:
-        component = assetversion.create_component(
-            component_path,
-            data=component_data,
-            location=location
+        path = component_path
+        if collection is not None:
+            path = collection
+
+        create_components(
+            session,
+            [{"name": component_name, "version": assetversion, "path": path}],
+            location
         )
 
 
@@ -186,6 +185,8 @@ def callback(event):
         })
     })
 
+    track_job(job["id"])
+
     try:
         create_component(
             session, event, component_name, assetversion, component
@@ -196,6 +197,8 @@ def callback(event):
     else:
         job["status"] = "done"
         session.commit()
+    finally:
+        release_job(job["id"])
 
 
 def register(session):
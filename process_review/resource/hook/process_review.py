@@ -1,15 +1,19 @@
 import os
-import tempfile
 import json
 import traceback
-import shutil
 import uuid
 import subprocess
 import getpass
+import threading
+import Queue
 
 import requests
 import ftrack_api
 from ftrack_hooks.action import BaseAction
+from ftrack_hooks.job import (
+    JobProgress, get_api_writer, track_job, release_job
+)
+from ftrack_hooks.scratch import ScratchSpace
 from ftrack_connect.session import get_shared_session
 
 
@@ -64,10 +68,17 @@ class ProcessReviewAction(BaseAction):
 
         return presets
 
-    def download_component(self, component, tempdir, server_location):
+    def get_scratch_budget(self):
+        """Return the scratch disk budget in bytes from the environment."""
+        budget = os.environ.get("REVIEW_SCRATCH_BUDGET")
+        if not budget:
+            return None
+
+        return int(float(budget) * 1024 * 1024)
+
+    def download_component(self, url, tempdir):
         """Downloads the components file from "ftrack.server" location."""
 
-        url = server_location.get_url(component)
         path = os.path.join(tempdir, str(uuid.uuid4()) + ".mov")
 
         r = requests.get(url, stream=True)
@@ -198,7 +209,8 @@ class ProcessReviewAction(BaseAction):
 
         session.commit()
 
-    def process_review(self, src_asset_version, preset, tempdir):
+    def get_review_source(self, src_asset_version, server_location):
+        """Return the source component, its url and its size."""
 
         session = get_shared_session()
 
@@ -207,14 +219,83 @@ class ProcessReviewAction(BaseAction):
             "name is \"ftrackreview-mp4\"".format(src_asset_version["id"])
         ).first()
 
-        # Get ftrack.server location
-        server_location = session.query(
-            "Location where name is \"ftrack.server\""
-        ).one()
+        url = server_location.get_url(src_component)
+
+        # Reserve room for the source movie and the processed review movie.
+        size = (src_component["size"] or 0) * 2
+
+        return [src_asset_version, src_component, url, size]
+
+    def download_sources(self, sources, scratch, downloads, stop):
+        """Download *sources* into scratch space and put them on *downloads*.
+
+        Each download waits for the scratch space budget, so downloading runs
+        ahead of processing only as far as the budget allows.
+        """
+        for src_asset_version, src_component, url, size in sources:
+            if stop.is_set():
+                break
 
-        movie_path = self.download_component(
-            src_component, tempdir, server_location
+            directory = None
+            try:
+                directory = scratch.create(size)
+                movie_path = self.download_component(url, directory)
+            except:
+                downloads.put(
+                    [src_asset_version, src_component, directory, size,
+                     None, traceback.format_exc()]
+                )
+                break
+
+            downloads.put(
+                [src_asset_version, src_component, directory, size,
+                 movie_path, None]
+            )
+
+        downloads.put(None)
+
+    def prefetch(self, sources, scratch):
+        """Yield downloaded *sources*, removing their scratch after use."""
+
+        downloads = Queue.Queue()
+        stop = threading.Event()
+
+        thread = threading.Thread(
+            target=self.download_sources,
+            args=(sources, scratch, downloads, stop)
         )
+        thread.daemon = True
+        thread.start()
+
+        item = []
+        try:
+            while True:
+                item = downloads.get()
+                if item is None:
+                    break
+
+                src_asset_version, src_component, directory, size = item[:4]
+                movie_path, error = item[4:]
+                try:
+                    if error:
+                        raise IOError(
+                            "Failed to download review movie:\n" + error
+                        )
+
+                    yield src_asset_version, src_component, movie_path
+                finally:
+                    if directory:
+                        scratch.remove(directory, size)
+        finally:
+            # Drain pending downloads to release their scratch space.
+            stop.set()
+            while item is not None:
+                item = downloads.get()
+                if item is not None and item[2]:
+                    scratch.remove(item[2], item[3])
+
+    def process_review(self, src_asset_version, src_component, movie_path,
+                       preset, server_location):
 
         [review_path, thumbnail_path] = self.process_preset(movie_path, preset)
 
@@ -244,21 +325,53 @@ class ProcessReviewAction(BaseAction):
                 }
             )
             session.commit()
-
-            tempdir = tempfile.mkdtemp()
+            track_job(job["id"])
 
             try:
-                for data in entities:
-                    entity = session.get(data[0], data[1])
-                    self.process_review(entity, preset, tempdir)
-            except:
-                print traceback.format_exc()
-                job["status"] = "failed"
-            else:
-                job["status"] = "done"
+                scratch = ScratchSpace(
+                    "process_review", budget=self.get_scratch_budget()
+                )
+                progress = JobProgress(
+                    get_api_writer(session, job), "Process review.",
+                    total=len(entities)
+                )
 
-            shutil.rmtree(tempdir)
-            session.commit()
+                try:
+                    # Get ftrack.server location
+                    server_location = session.query(
+                        "Location where name is \"ftrack.server\""
+                    ).one()
+
+                    sources = []
+                    for data in entities:
+                        entity = session.get(data[0], data[1])
+                        sources.append(
+                            self.get_review_source(entity, server_location)
+                        )
+
+                    downloads = self.prefetch(sources, scratch)
+                    try:
+                        for src_asset_version, src_component, movie_path in (
+                            downloads
+                        ):
+                            self.process_review(
+                                src_asset_version, src_component, movie_path,
+                                preset, server_location
+                            )
+                            progress.update(items=1)
+                    finally:
+                        downloads.close()
+                except:
+                    print traceback.format_exc()
+                    progress.finish()
+                    job["status"] = "failed"
+                else:
+                    progress.finish()
+                    job["status"] = "done"
+
+                session.commit()
+            finally:
+                release_job(job["id"])
 
             return {
                 'success': True,
@@ -291,6 +404,9 @@ def register(session):
     if not isinstance(session, ftrack_api.Session):
         return
 
+    # Remove scratch space left behind by previous processes.
+    ScratchSpace("process_review").sweep()
+
     # Create action and register to respond to discover and launch actions.
     action = ProcessReviewAction(session)
     action.register()
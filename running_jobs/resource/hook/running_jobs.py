@@ -1,5 +1,145 @@
+import os
+import json
+import time
+import logging
+import datetime
+import threading
+import traceback
+
 import ftrack_api
 from ftrack_hooks.action import BaseAction
+from ftrack_hooks.job import get_tracker
+from ftrack_hooks.query import chunks, format_ids, query_in
+
+logger = logging.getLogger(__name__)
+
+
+def get_running_job_ids(session, age=None, username=None, description=None,
+                        exclude=None):
+    """Return the ids of running jobs matching the filters.
+
+    *age* is the minimum age in hours, *username* the user that created the
+    job and *description* a text the job description contains. Jobs in
+    *exclude* are left out.
+    """
+    conditions = ["status is \"running\""]
+
+    if age:
+        created = datetime.datetime.utcnow() - datetime.timedelta(hours=age)
+        conditions.append(
+            "created_at < \"{0}\"".format(
+                created.strftime("%Y-%m-%dT%H:%M:%S")
+            )
+        )
+
+    if username:
+        conditions.append(
+            "user.username is \"{0}\"".format(username.replace("\"", "\\\""))
+        )
+
+    if description:
+        conditions.append(
+            "data like \"%{0}%\"".format(description.replace("\"", "\\\""))
+        )
+
+    exclude = set(exclude or [])
+    return [
+        job["id"] for job in session.query(
+            "select id from Job where " + " and ".join(conditions)
+        )
+        if job["id"] not in exclude
+    ]
+
+
+def update_job_status(session, job_ids, status, chunk_size=200,
+                      progress=None):
+    """Set *job_ids* to *status* committing *chunk_size* jobs at a time.
+
+    *progress* is an optional callable receiving the amount of jobs updated
+    so far and the total amount of jobs.
+    """
+    done = 0
+    for chunk in chunks(job_ids, chunk_size):
+        jobs = session.query(
+            "select status from Job where id in ({0})".format(
+                format_ids(chunk)
+            )
+        )
+        for job in jobs:
+            job["status"] = status
+
+        session.commit()
+
+        done += len(chunk)
+        if progress:
+            progress(done, len(job_ids))
+
+    return done
+
+
+class StaleJobReaper(object):
+    """Fail the running jobs of processes that died.
+
+    Hooks track the jobs they run with heartbeat files, see
+    `ftrack_hooks.job`. Every `interval` seconds the reaper looks for
+    heartbeat files not touched for `timeout` seconds, and sets the jobs
+    in them that are still running to failed.
+    """
+
+    def __init__(self, interval=600, timeout=600):
+        """Expects the *timeout* to be well above the heartbeat interval."""
+        self.interval = interval
+        self.timeout = timeout
+
+    def start(self):
+        """Start reaping in a background thread."""
+        thread = threading.Thread(target=self.run)
+        thread.daemon = True
+        thread.start()
+
+    def run(self):
+        while True:
+            try:
+                self.reap()
+            except:
+                logger.error(traceback.format_exc())
+
+            time.sleep(self.interval)
+
+    def reap(self):
+        """Fail the running jobs of orphaned heartbeat files."""
+        tracker = get_tracker()
+        orphaned = tracker.get_orphaned(self.timeout)
+        if not orphaned:
+            return
+
+        job_ids = set()
+        for path, ids in orphaned:
+            job_ids.update(ids)
+
+        # A session per reap, closed when done, as reaps are far apart.
+        with ftrack_api.Session() as session:
+            running_ids = [
+                job["id"] for job in query_in(
+                    session,
+                    "select id from Job where status is \"running\" and id "
+                    "in ({0})",
+                    job_ids
+                )
+            ]
+
+            logger.info(
+                "Setting {0} orphaned running jobs to failed.".format(
+                    len(running_ids)
+                )
+            )
+            update_job_status(session, running_ids, "failed")
+
+        for path, ids in orphaned:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
 
 
 class RunningJobsAction(BaseAction):
@@ -27,21 +167,66 @@ class RunningJobsAction(BaseAction):
 
         return True
 
-    def launch(self, session, entities, event):
+    def update_jobs(self, event):
+        """Update the running jobs matching the submitted values."""
 
-        if "values" in event["data"]:
+        values = event["data"]["values"]
+        status = values["status"]
 
-            status = event["data"]["values"]["status"]
+        session = ftrack_api.Session()
+        user = session.query(
+            "User where username is \"{0}\"".format(
+                event["source"]["user"]["username"]
+            )
+        ).one()
 
-            running_jobs = session.query("Job where status is \"running\"")
-            for job in running_jobs:
-                job["status"] = status
+        job = session.create(
+            "Job",
+            {
+                "user": user,
+                "status": "running",
+                "data": json.dumps({"description": "Running Jobs."})
+            }
+        )
+        session.commit()
 
+        def progress(done, total):
+            job["data"] = json.dumps({
+                "description": "Running Jobs: Set {0}/{1} jobs to {2}.".format(
+                    done, total, status
+                )
+            })
             session.commit()
 
+        try:
+            job_ids = get_running_job_ids(
+                session,
+                age=float(values.get("age") or 0),
+                username=values.get("username"),
+                description=values.get("description"),
+                exclude=[job["id"]]
+            )
+            progress(0, len(job_ids))
+            update_job_status(session, job_ids, status, progress=progress)
+        except:
+            logger.error(traceback.format_exc())
+            session.rollback()
+            job["status"] = "failed"
+        else:
+            job["status"] = "done"
+
+        session.commit()
+
+    def launch(self, session, entities, event):
+
+        if "values" in event["data"]:
+
+            thread = threading.Thread(target=self.update_jobs, args=(event,))
+            thread.start()
+
             return {
                 'success': True,
-                'message': 'Action completed successfully'
+                'message': 'Updating running jobs. Click Job for details.'
             }
 
         return {
@@ -56,6 +241,24 @@ class RunningJobsAction(BaseAction):
                         {"label": "Failed", "value": "failed"},
                         {"label": "Done", "value": "done"}
                     ]
+                },
+                {
+                    "label": "Older than (hours, 0 = all)",
+                    "type": "number",
+                    "name": "age",
+                    "value": 0
+                },
+                {
+                    "label": "Created by user (empty = all)",
+                    "type": "text",
+                    "name": "username",
+                    "value": ""
+                },
+                {
+                    "label": "Description contains (empty = all)",
+                    "type": "text",
+                    "name": "description",
+                    "value": ""
                 }
             ]
         }
@@ -72,3 +275,9 @@ def register(session):
     # Create action and register to respond to discover and launch actions.
     action = RunningJobsAction(session)
     action.register()
+
+    # Fail jobs left running by processes that died.
+    interval = float(os.environ.get("FTRACK_HOOKS_REAPER_INTERVAL", 600))
+    if interval > 0:
+        reaper = StaleJobReaper(interval=interval)
+        reaper.start()
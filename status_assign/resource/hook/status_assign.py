@@ -1,40 +1,131 @@
-import os
 import sys
+import time
 import logging
 import argparse
+import threading
+import collections
 
 import ftrack_api
+from ftrack_hooks.dispatcher import get_dispatcher
+from ftrack_hooks.query import chunks, query_in
+
+logger = logging.getLogger(__name__)
+
+#: Metadata key prefix of the users assigned by a status.
+ASSIGNEE_KEY = "status_assign."
+
+
+class StatusGroupIndex(object):
+    """Per project index of status groups to the users to assign.
+
+    Maps the lower case (status name, task type name) of the groups
+    allocated to a project to the ids of the users in the matching sub
+    group. Projects are indexed with a few bulk queries on first use and
+    dropped again when allocations, groups or memberships change, or after
+    `ttl` seconds.
+    """
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self._projects = {}
+        self._lock = threading.Lock()
+
+    def invalidate(self, project_id=None):
+        """Drop the index of *project_id*, or of all projects."""
+        with self._lock:
+            if project_id is None:
+                self._projects.clear()
+            else:
+                self._projects.pop(project_id, None)
+
+    def get_user_ids(self, session, project_id, status_name, type_name):
+        """Return the user ids to assign for *status_name* and *type_name*."""
+        with self._lock:
+            index, created = self._projects.get(project_id, (None, 0))
+
+        if index is None or time.time() - created > self.ttl:
+            index = self.build(session, project_id)
+            with self._lock:
+                self._projects[project_id] = (index, time.time())
+
+        return index.get((status_name.lower(), type_name.lower()), set())
+
+    def build(self, session, project_id):
+        """Return the index of *project_id* queried in bulk."""
+        allocated_ids = set(
+            allocation["resource_id"] for allocation in session.query(
+                "select resource_id from Appointment where context_id is "
+                "\"{0}\" and type is \"allocation\"".format(project_id)
+            )
+        )
 
+        # Groups named after statuses.
+        status_groups = {}
+        for group in query_in(
+            session, "select name from Group where id in ({0})", allocated_ids
+        ):
+            status_groups[group["id"]] = group["name"].lower()
+
+        # Sub groups named after task types.
+        type_groups = {}
+        for group in query_in(
+            session,
+            "select name, parent_id from Group where parent_id in ({0})",
+            status_groups.keys()
+        ):
+            type_groups[group["id"]] = (
+                status_groups[group["parent_id"]], group["name"].lower()
+            )
 
-def callback(event):
+        index = collections.defaultdict(set)
+        for membership in query_in(
+            session,
+            "select user_id, group_id from Membership where group_id in ({0})",
+            type_groups.keys()
+        ):
+            index[type_groups[membership["group_id"]]].add(
+                membership["user_id"]
+            )
 
-    # Return early if event wasn"t triggered by the current user.
-    if event["source"]["user"]["username"] != os.environ["FTRACK_API_USER"]:
-        return
+        return dict(index)
 
-    session = ftrack_api.Session()
-    for entity_data in event["data"]["entities"]:
 
-        # Filter to tasks.
-        if entity_data["entityType"].lower() != "task":
-            continue
+INDEX = StatusGroupIndex()
 
-        if "statusid" not in entity_data["keys"]:
-            continue
 
-        task = session.get("Task", entity_data["entityId"])
+def get_assignee_ids(task):
+    """Return the ids of the users assigned to *task* by a status."""
+    metadata = task["metadata"]
+
+    assignee_ids = set()
+    for key in metadata.keys():
+        if key.startswith(ASSIGNEE_KEY):
+            assignee_ids.add(key[len(ASSIGNEE_KEY):])
+
+    # Assignees stored by earlier versions of the plugin.
+    if metadata.get("assignees"):
+        assignee_ids.update(metadata["assignees"].split(","))
+
+    return assignee_ids
 
-        # Status assignees.
-        assignees = []
-        if task["metadata"].get("assignees"):
-            assignees = [
-                session.get("User", userid)
-                for userid in task["metadata"]["assignees"].split(",")
-            ]
 
-        # Get task users and remove status assigned users.
-        task_users = set()
-        status_appointments = []
+def compute_changes(session, updates):
+    """Return the appointment changes of all tasks in *updates*.
+
+    Each change is a dictionary with the `task`, the `remove` appointments
+    of users assigned by the previous status, the ids of users to `create`
+    appointments for and to `keep` appointed, and the ids of all users
+    currently `appointed`.
+    """
+    changes = []
+    for update in updates:
+        entity_data = update["entity_data"]
+        task = update["entity"]
+
+        assignee_ids = get_assignee_ids(task)
+
+        # Users appointed to the task.
+        appointments = {}
         for appointment in task["appointments"]:
             resource = appointment["resource"]
 
@@ -42,71 +133,185 @@ def callback(event):
             if not isinstance(resource, session.types["User"]):
                 continue
 
-            if resource in assignees:
-                status_appointments.append(appointment)
-                continue
+            appointments[resource["id"]] = appointment
 
-            task_users.add(resource)
+        # Users of the status group matching the task type.
+        status_user_ids = INDEX.get_user_ids(
+            session,
+            entity_data["parents"][-1]["entityId"],
+            task["status"]["name"],
+            task["type"]["name"]
+        )
 
-        for appointment in status_appointments:
-            session.delete(appointment)
+        # Unassign users only appointed by a previous status, and assign
+        # status users not yet appointed.
+        previous_ids = assignee_ids.intersection(appointments)
+
+        changes.append({
+            "task": task,
+            "remove": [
+                appointments[user_id]
+                for user_id in previous_ids - status_user_ids
+            ],
+            "create": status_user_ids - set(appointments),
+            "keep": previous_ids & status_user_ids,
+            "appointed": set(appointments)
+        })
+
+    return changes
+
+
+def apply_change(session, change, users):
+    """Apply the appointments and assignee metadata of *change*."""
+    task = change["task"]
+    metadata = task["metadata"]
+
+    appointed_ids = set(change["appointed"])
+    for appointment in change["remove"]:
+        appointed_ids.discard(appointment["resource"]["id"])
+        session.delete(appointment)
+
+    assigned_ids = set(change["keep"])
+    for user_id in change["create"]:
+        if user_id not in users:
+            continue
 
-        # Getting status members.
-        project = session.get(
-            "Project", entity_data["parents"][-1]["entityId"]
+        session.create(
+            "Appointment",
+            {
+                "context": task,
+                "resource": users[user_id],
+                "type": "assignment"
+            }
         )
-        status_users = set()
-        for allocation in project["allocations"]:
-            resource = allocation["resource"]
+        assigned_ids.add(user_id)
+        appointed_ids.add(user_id)
+
+    # Forget assignees no longer appointed, ie. unassigned by hand, so they
+    # are not taken for assigned by a status when appointed again.
+    for key in list(metadata.keys()):
+        if (
+            key.startswith(ASSIGNEE_KEY) and
+            key[len(ASSIGNEE_KEY):] not in appointed_ids
+        ):
+            del metadata[key]
+
+    # Each assignee is stored under its own key, so concurrent changes to
+    # different users of a task do not overwrite each other.
+    for user_id in assigned_ids:
+        key = ASSIGNEE_KEY + user_id
+        if key not in metadata:
+            metadata[key] = task["status"]["name"]
+
+    if "assignees" in metadata:
+        del metadata["assignees"]
+
+
+def apply_changes(session, changes, chunk_size=50):
+    """Apply *changes* committing *chunk_size* tasks at a time."""
+
+    # Resolve users to assign in bulk.
+    user_ids = set()
+    for change in changes:
+        user_ids.update(change["create"])
+
+    users = {}
+    for user in query_in(
+        session, "select id from User where id in ({0})", user_ids
+    ):
+        users[user["id"]] = user
 
-            # Filter to groups.
-            if not isinstance(resource, session.types["Group"]):
-                continue
+    for chunk in chunks(changes, chunk_size):
+        for change in chunk:
+            apply_change(session, change, users)
 
-            # Filter to groups named the same as the tasks status.
-            if resource["name"].lower() != task["status"]["name"].lower():
-                continue
+        try:
+            session.commit()
+        except Exception:
+            logger.exception(
+                "Failed to assign users to {0} tasks.".format(len(chunk))
+            )
+            session.rollback()
 
-            for child in resource["children"]:
-                # Filter to groups.
-                if not isinstance(child, session.types["Group"]):
-                    continue
 
-                # Filter to groups named the same as the tasks type.
-                if child["name"].lower() != task["type"]["name"].lower():
-                    continue
+def callback(session, updates):
+    """Assign the status group members to tasks changing status."""
+    apply_changes(session, compute_changes(session, updates))
 
-                # Collect all users from group.
-                for membership in child["memberships"]:
-                    status_users.add(membership["user"])
 
-        # Assign members to task.
-        assigned_users = []
-        for user in status_users:
-            if user in task_users:
-                continue
+def get_change(entity_data, key):
+    """Return the new, or else old, value of *key* in *entity_data*."""
+    change = (entity_data.get("changes") or {}).get(key) or {}
+    return change.get("new") or change.get("old")
 
-            session.create(
-                "Appointment",
-                {
-                    "context": task,
-                    "resource": user,
-                    "type": "assignment"
-                }
-            )
-            assigned_users.append(user)
 
-        # Storing new assignees.
-        task["metadata"].update(
-            {"assignees": ",".join([user["id"] for user in assigned_users])}
-        )
+def invalidate(session, updates):
+    """Drop the status group index when allocations or groups change.
+
+    Allocations only affect the project they allocate to, and assignments,
+    like the ones made by this plugin, do not affect the index at all.
+    Groups and memberships may be allocated to any project.
+    """
+    for update in updates:
+        entity_data = update["entity_data"]
+
+        if update["entity_type"].lower() != "appointment":
+            INDEX.invalidate()
+            continue
+
+        if get_change(entity_data, "type") == "assignment":
+            continue
+
+        # Allocations are appointments in the context of a project.
+        INDEX.invalidate(get_change(entity_data, "context_id"))
 
-        session.commit()
+
+def get_subscription(session):
+    """Return the update subscription filtered to the sessions user.
+
+    The event hub can only match the scalar source of an event, so entity
+    types and changed keys are filtered locally by the dispatcher before any
+    entity is looked up.
+    """
+    return "topic=ftrack.update and source.user.username={0}".format(
+        session.api_user
+    )
+
+
+def get_index_subscription():
+    """Return the update subscription keeping the status group index fresh.
+
+    Subscriptions can not match the entity types of an event, which are
+    listed in its data, so the narrowest filter is the web client, where
+    groups, memberships and allocations are edited. Entity types are then
+    filtered locally. Changes made through the API, including the plugin's
+    own assignments, are not sent, and are picked up within the `ttl` of
+    the index instead.
+    """
+    return "topic=ftrack.update and source.applicationId=ftrack.client.web"
 
 
 def register(session, **kw):
-    # Subscribe to events with the update topic.
-    session.event_hub.subscribe("topic=ftrack.update", callback)
+    # Dispatch task status changes of the current user.
+    dispatcher = get_dispatcher(session, get_subscription(session))
+    dispatcher.register(
+        callback,
+        actions=None,
+        projections=[
+            "metadata", "status.name", "type.name", "appointments.resource"
+        ]
+    )
+
+    # Keep the status group index up to date with the changes of anyone.
+    dispatcher = get_dispatcher(session, get_index_subscription())
+    for entity_type in ("appointment", "group", "membership"):
+        dispatcher.register(
+            invalidate,
+            entity_type=entity_type,
+            keys=None,
+            actions=None,
+            resolve=None
+        )
 
 
 def main(arguments=None):